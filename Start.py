@@ -1,45 +1,31 @@
 import streamlit as st
-import base64
+from utils.assets import get_assets
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
 from utils.ui_helpers import apply_theme
-from PIL import Image
-import io
-
-# ===== Hilfsfunktion: Icon einlesen =====
-def load_icon_base64(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-    
-# ===== Icons laden =====
-icon_chemie = load_icon_base64("assets/chemie.png")
-icon_haema = load_icon_base64("assets/blood.png")
-icon_klinik = load_icon_base64("assets/clinical_chemistry.png")
-icon_header = load_icon_base64("assets/labor.png")
-icon_screen = load_icon_base64("assets/screen.png")
-icon_hello = load_icon_base64("assets/groundhog.png")
-icon_chemical = load_icon_base64("assets/chemical.png")
-icon_journal = load_icon_base64("assets/journal.png")
-
-def load_icon_bytes(path):
-    with open(path, "rb") as image_file:
-        return image_file.read()
-    
-icon_bytes = load_icon_bytes("assets/journal.png")
-
-# Konvertiere zu PIL.Image (für Streamlit-kompatibles Format)
-icon_image = Image.open(io.BytesIO(icon_bytes))
+
+# ===== Icons laden (einmal pro Prozess) =====
+assets = get_assets()
+icon_chemie = assets.url("chemie")
+icon_haema = assets.url("blood")
+icon_klinik = assets.url("clinical_chemistry")
+icon_header = assets.url("labor")
+icon_screen = assets.url("screen")
+icon_hello = assets.url("groundhog")
+icon_chemical = assets.url("chemical")
+icon_journal = assets.url("journal")
 
 # Setze das Page-Icon mit PIL.Image
 st.set_page_config(
     page_title="Laborjournal",
-    page_icon=icon_image,
+    page_icon=assets.image("journal"),
     layout="centered",
     initial_sidebar_state="collapsed"
 )
 
 # ===== Initialisierung =====
-data_manager = DataManager(fs_protocol='webdav', fs_root_folder="App_Melinja")
+data_manager = DataManager(fs_protocol='webdav', fs_root_folder="App_Melinja", read_cache_folder=".cache/read_cache",
+                           metrics_file=".cache/metrics.prom")
 login_manager = LoginManager(data_manager)
 
 # ===== Theme-Schalter (links ausgerichtet) =====
@@ -53,7 +39,7 @@ with st.container():
             <span style='font-size: 16px; color: {"#000" if st.session_state.theme == "light" else "#fff"};'>
                 Design-Modus wählen:
             </span>
-            <img src="data:image/png;base64,{icon_screen}" width="24">
+            <img src="{icon_screen}" width="24">
         </div>
         """,
         unsafe_allow_html=True
@@ -128,7 +114,7 @@ if st.button("Logout 🔓"):
 if "username" in st.session_state:
     st.markdown(f"""
     <div style='text-align: right; font-size: 20px; font-weight: bold; margin-top: 10px;'>
-        <img src="data:image/png;base64,{icon_hello}" width="40" style="vertical-align: middle; margin-right: 6px;">
+        <img src="{icon_hello}" width="40" style="vertical-align: middle; margin-right: 6px;">
         <span style='color:#2c3e50;'>{st.session_state['username']}</span>!
         <div style='font-size: 16px; color: #888;'>Bereit für dein nächstes Praktikum?</div>
     </div>
@@ -139,7 +125,7 @@ st.markdown(f"""
     <div style='text-align: center; margin-top: 30px; margin-bottom: 20px;'>
         <p style='font-size: 22px;'>Dein persönliches</p>
         <h1 style='font-size: 50px; font-weight: bold;'>
-            Laborjournal <img src="data:image/png;base64,{icon_header}" width="36" style="vertical-align: middle;">
+            Laborjournal <img src="{icon_header}" width="36" style="vertical-align: middle;">
         </h1>
     </div>
 """, unsafe_allow_html=True)
@@ -178,7 +164,7 @@ for col, icon, name, fach, farbe in zip([col1, col2, col3], symbole, namen, schl
     with col:
         st.markdown(f"""
             <div class="fachkarte" style="background-color: {farbe};">
-                <img src="data:image/png;base64,{icon}" width="40"><br>
+                <img src="{icon}" width="40"><br>
                 <span style="font-size: 18px; font-weight: bold;">{name}</span>
             </div>
         """, unsafe_allow_html=True)
@@ -190,6 +176,11 @@ for col, icon, name, fach, farbe in zip([col1, col2, col3], symbole, namen, schl
                 st.switch_page("pages/01_Datei.py")
             st.markdown('</div>', unsafe_allow_html=True)
 
+# ===== Globale Suche =====
+# Die Suchindizes werden erst auf der Suchseite geladen
+if st.button("🔎 Alle Einträge durchsuchen", use_container_width=True):
+    st.switch_page("pages/05_Suche.py")
+
 # ===== Hinweis unten =====
 st.markdown(f"""
 <div style="background-color: {hinweis_bg}; color: {hinweis_color}; padding: 15px; border-radius: 8px; font-size: 16px; margin-top: 40px;">
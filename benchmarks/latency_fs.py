@@ -0,0 +1,92 @@
+import random, threading, time
+
+# Filesystem calls that cost one round-trip to the server
+ROUND_TRIP_METHODS = {
+    "exists", "info", "ls", "find", "glob", "isdir", "isfile", "size",
+    "rm", "rm_file", "delete", "mkdir", "mkdirs", "makedirs", "mv", "copy",
+    "cat", "cat_file", "pipe", "pipe_file",
+}
+
+
+class InjectedFailure(OSError):
+    """Raised by LatencyFileSystem to simulate a failing request."""
+
+
+class LatencyFileSystem:
+    """
+    Wraps an fsspec filesystem and injects latency, a bandwidth limit and random failures.
+
+    Every round-trip call (exists, ls, info, ...) and every open() waits `latency`
+    seconds; reads and writes additionally wait `bytes / bandwidth` seconds. All other
+    attributes are passed through to the wrapped filesystem.
+
+        >>> fs = LatencyFileSystem(fsspec.filesystem("file"), latency=0.08, bandwidth=2_000_000)
+    """
+
+    def __init__(self, fs, latency=0.0, bandwidth=None, failure_rate=0.0, seed=None):
+        """
+        Args:
+            fs: The wrapped fsspec filesystem.
+            latency: Delay per request in seconds.
+            bandwidth: Transfer rate in bytes per second, None for unlimited.
+            failure_rate: Probability (0..1) that a request raises InjectedFailure.
+            seed: Optional seed for the failure generator.
+        """
+        self.fs = fs
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, num_bytes=0, round_trip=True):
+        with self._lock:
+            fail = self.failure_rate and self._random.random() < self.failure_rate
+        if fail:
+            raise InjectedFailure("Injected storage failure")
+        seconds = self.latency if round_trip else 0.0
+        if self.bandwidth and num_bytes:
+            seconds += num_bytes / self.bandwidth
+        if seconds:
+            time.sleep(seconds)
+
+    def open(self, path, mode="rb", **kwargs):
+        self.delay()
+        return _LatencyFile(self.fs.open(path, mode, **kwargs), self)
+
+    def __getattr__(self, name):
+        attr = getattr(self.fs, name)
+        if name not in ROUND_TRIP_METHODS or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.delay()
+            return attr(*args, **kwargs)
+        return call
+
+
+class _LatencyFile:
+    """File wrapper charging the bandwidth limit for every byte read or written."""
+
+    def __init__(self, f, fs):
+        self._f = f
+        self._fs = fs
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._fs.delay(len(data), round_trip=False)
+        return data
+
+    def write(self, data):
+        self._fs.delay(len(data), round_trip=False)
+        return self._f.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
@@ -0,0 +1,198 @@
+"""
+Benchmark suite for the Laborjournal pages.
+
+Runs the real pages with Streamlit's AppTest against a local WebDAV server
+(wsgidav) or the local filesystem, with configurable latency, bandwidth and
+failure injection, and reports p50/p95 timings:
+
+    python -m benchmarks.run_benchmarks --entries 200 --latency 0.08 --runs 10
+
+Install the extra dependencies with `pip install -r benchmarks/requirements.txt`.
+"""
+import argparse, contextlib, json, os, statistics, sys, tempfile, time
+
+import fsspec
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.latency_fs import LatencyFileSystem
+from benchmarks.seed import seed_user
+from benchmarks.webdav_server import LocalWebdavServer
+from utils import metrics
+from utils.data_manager import DataManager
+from utils.export_jobs import get_export_queue
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_FOLDER = "App_Bench"
+USERNAME = "bench_user"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def make_app(page, fs, root, fach=None, timeout=120):
+    """
+    Create an AppTest for a page with a logged in benchmark user and a DataManager using `fs` and `root`.
+    """
+    at = AppTest.from_file(page, default_timeout=timeout)
+    at.session_state["authentication_status"] = True
+    at.session_state["username"] = USERNAME
+    at.session_state["name"] = "Bench User"
+    if fach:
+        at.session_state["fach"] = fach
+    at.session_state["data_manager"] = DataManager(fs_protocol=fs, fs_root_folder=root)
+    return at
+
+
+def time_reruns(at, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        durations.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"Page raised: {at.exception[0].message}")
+    return durations
+
+
+def click(at, label_part):
+    button = next(b for b in at.button if label_part in b.label)
+    start = time.perf_counter()
+    button.click().run()
+    return time.perf_counter() - start
+
+
+def bench_overview(fs, root, runs):
+    results = {}
+    for fach in ["chemie", "haematologie", "klinische chemie"]:
+        at = make_app("pages/01_Datei.py", fs, root, fach=fach)
+        results[f"01_Datei rerun ({fach})"] = time_reruns(at, runs)
+    return results
+
+
+def bench_exports(fs, root, runs):
+    """
+    Time the export click (entry stored, rendering queued) and the time until the
+    background export finished and both documents are stored.
+    """
+    results = {}
+    queue = get_export_queue()
+    for page in ["pages/02_Haematologie.py", "pages/03_Chemie.py"]:
+        clicks, completed = [], []
+        for i in range(runs):
+            at = make_app(page, fs, root)
+            at.run()
+            at.text_input[0].input(f"Benchmark {i}").run()
+            start = time.perf_counter()
+            clicks.append(click(at, "Speichern und Exportieren"))
+            if not queue.wait(timeout=at.default_timeout):
+                raise RuntimeError(f"Export of {page} did not finish")
+            completed.append(time.perf_counter() - start)
+        results[f"{os.path.basename(page)} export"] = clicks
+        results[f"{os.path.basename(page)} export finished"] = completed
+    return results
+
+
+@contextlib.contextmanager
+def no_temp_files(folder):
+    """
+    Point the temp directory of this process and of the export worker processes
+    (spawned later, they inherit TMPDIR) to an empty folder, and fail if any file
+    is left in it afterwards. Exports have to run fully in memory.
+    """
+    os.makedirs(folder, exist_ok=True)
+    previous = os.environ.get("TMPDIR")
+    os.environ["TMPDIR"] = folder
+    tempfile.tempdir = None  # gettempdir() caches its result
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("TMPDIR", None)
+        else:
+            os.environ["TMPDIR"] = previous
+        tempfile.tempdir = None
+    left = [os.path.relpath(os.path.join(d, f), folder) for d, _, files in os.walk(folder) for f in files]
+    if left:
+        raise RuntimeError(f"Exports left {len(left)} temporary file(s) behind: {', '.join(sorted(left)[:10])}")
+
+
+def bench_atlas(fs, root, runs):
+    """
+    Time the page rerun (no export) and the export click, which renders the atlas on
+    the first run and comes from the export cache after that.
+    """
+    at = make_app("pages/08_Zellatlas.py", fs, root)
+    results = {"08_Zellatlas render": time_reruns(at, runs)}
+    exports = []
+    for _ in range(runs):
+        at = make_app("pages/08_Zellatlas.py", fs, root)
+        at.run()
+        exports.append(click(at, "Zellatlas exportieren"))
+    results["08_Zellatlas export"] = exports
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["webdav", "file"], default="webdav")
+    parser.add_argument("--entries", type=int, default=100, help="entries per subject")
+    parser.add_argument("--attachments", type=int, default=2, help="attachments per entry")
+    parser.add_argument("--atlas-entries", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        server = None
+        if args.backend == "webdav":
+            server = LocalWebdavServer(tmp_dir).start()
+            base_fs = fsspec.filesystem("webdav", base_url=server.base_url, auth=server.auth)
+            root = ROOT_FOLDER
+        else:
+            base_fs = fsspec.filesystem("file")
+            root = os.path.join(tmp_dir, ROOT_FOLDER)
+
+        try:
+            print(f"Seeding {args.entries} entries x {args.attachments} attachments per subject ...", file=sys.stderr)
+            seed_user(base_fs, root, USERNAME, entries=args.entries, attachments=args.attachments,
+                      atlas_entries=args.atlas_entries)
+
+            fs = LatencyFileSystem(base_fs, latency=args.latency, bandwidth=args.bandwidth,
+                                   failure_rate=args.failure_rate)
+            metrics.reset()
+            results = {}
+            cwd = os.getcwd()
+            os.chdir(REPO_ROOT)  # the pages load their icons relative to the repository root
+            try:
+                results.update(bench_overview(fs, root, args.runs))
+                with no_temp_files(os.path.join(tmp_dir, "export_tmp")):
+                    results.update(bench_exports(fs, root, args.runs))
+                    results.update(bench_atlas(fs, root, args.runs))
+            finally:
+                os.chdir(cwd)
+        finally:
+            if server is not None:
+                server.stop()
+
+    report = {name: {"p50": percentile(d, 50), "p95": percentile(d, 95), "mean": statistics.mean(d), "runs": len(d)}
+              for name, d in results.items()}
+    width = max(len(name) for name in report)
+    print(f"{'benchmark'.ljust(width)}  {'p50 [s]':>9}  {'p95 [s]':>9}")
+    for name, r in report.items():
+        print(f"{name.ljust(width)}  {r['p50']:9.3f}  {r['p95']:9.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": report, "storage": metrics.snapshot()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import io, random, uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+from PIL import Image
+
+from utils.blob_store import BlobStore
+from utils.data_handler import DataHandler
+from utils.schemas import CHEMIE_SCHEMA, HAEMATOLOGIE_SCHEMA, KLINISCHE_CHEMIE_SCHEMA
+
+LOREM = ("Pipettieren Zentrifugieren Titration Pufferlösung Extinktion Kalibration Standardreihe "
+         "Photometer Reagenz Verdünnung Leerwert Kontrolle Probe Serum Plasma Vollblut").split()
+
+# fach -> (dataset file, word folder, attachment folder, schema)
+SUBJECTS = {
+    "chemie": ("data_chemie.parquet", "word_chemie", "anhang_chemie", CHEMIE_SCHEMA),
+    "haematologie": ("data_haematologie.parquet", "word_haematologie", "anhang_haematologie", HAEMATOLOGIE_SCHEMA),
+    "klinische chemie": ("data_klinische_chemie_{username}.parquet", "word_klinische_chemie",
+                         "anhang_klinische_chemie", KLINISCHE_CHEMIE_SCHEMA),
+}
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(LOREM) for _ in range(words))
+
+
+def _png(rng, size=(320, 240)):
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def seed_user(fs, root, username, entries=100, attachments=2, atlas_entries=20, attachment_bytes=200_000, seed=0):
+    """
+    Create a synthetic user with `entries` entries per subject, `attachments` attachments per
+    entry and `atlas_entries` Zellatlas entries.
+
+    Args:
+        fs: The fsspec filesystem to seed (usually the unwrapped one, so seeding is not delayed).
+        root: The app root folder (fs_root_folder of the DataManager).
+        username: Name of the synthetic user.
+    """
+    rng = random.Random(seed)
+    blob_store = BlobStore(DataHandler(fs, f"{root}/blobs"), DataHandler(fs, f"{root}/user_data_{username}"))
+    start = datetime(2024, 2, 19)
+
+    for fach, (file_name, word_folder, _, schema) in SUBJECTS.items():
+        dh_word = DataHandler(fs, f"{root}/{word_folder}/{username}")
+        records, word_files, blobs = [], {}, []
+        for i in range(entries):
+            datum = start + timedelta(days=rng.randrange(500))
+            timestamp = datum.strftime("%Y%m%d%H%M%S")
+            dateiname = f"{timestamp}_{i:05d}_bericht.docx"
+            word_files[dateiname] = rng.randbytes(20_000)
+            anhaenge = []
+            for _ in range(attachments):
+                name = f"{timestamp}_{uuid.uuid4().hex[:8]}_protokoll.pdf"
+                blobs.append((name, rng.randbytes(attachment_bytes)))
+                anhaenge.append(name)
+            record = {col: _text(rng, 40) for col in schema.text_columns}
+            record.update({
+                "titel": f"{fach.title()} Versuch {i} {_text(rng, 2)}",
+                "semester": str(rng.randint(1, 6)),
+                "dateiname": dateiname,
+                "anhaenge": anhaenge,
+                "bilder": [],
+                "datum": datum.strftime("%Y-%m-%d"),
+                "zeit": datum.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            records.append(record)
+
+        dh_word.write_many(word_files)
+        blob_store.put_many(blobs)
+        df = schema.serialize(schema.apply(pd.DataFrame(records)), native=True)
+        DataHandler(fs, f"{root}/user_data_{username}").save(file_name.format(username=username), df)
+
+    dh_atlas = DataHandler(fs, f"{root}/zellatlas_haematologie/{username}")
+    files = {}
+    for i in range(atlas_entries):
+        zeit = start + timedelta(hours=i)
+        timestamp = zeit.strftime("%Y%m%dT%H%M%S")
+        bild = f"{timestamp}_zelle_{i}.png"
+        files[bild] = _png(rng)
+        files[f"{timestamp}_lymphozyt_{i}.yaml"] = {
+            "typ": "Weisses Blutbild: Lymphozyt",
+            "beschreibung": _text(rng, 30),
+            "zeit": zeit.isoformat(),
+            "bild": bild,
+        }
+    dh_atlas.write_many(files)
@@ -0,0 +1,66 @@
+import socket, threading
+
+
+def _free_port(host):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class LocalWebdavServer:
+    """
+    Local WebDAV stand-in (wsgidav served by cheroot) for benchmarks.
+
+        >>> with LocalWebdavServer("/tmp/dav") as server:
+        ...     fs = fsspec.filesystem("webdav", base_url=server.base_url, auth=server.auth)
+    """
+
+    USERNAME = "bench"
+    PASSWORD = "bench"
+
+    def __init__(self, root_dir, host="127.0.0.1", port=None):
+        self.root_dir = root_dir
+        self.host = host
+        self.port = port or _free_port(host)
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def auth(self):
+        return (self.USERNAME, self.PASSWORD)
+
+    def start(self):
+        from cheroot import wsgi
+        from wsgidav.wsgidav_app import WsgiDAVApp
+
+        config = {
+            "host": self.host,
+            "port": self.port,
+            "provider_mapping": {"/": self.root_dir},
+            "http_authenticator": {"accept_basic": True, "accept_digest": False, "default_to_digest": False},
+            "simple_dc": {"user_mapping": {"*": {self.USERNAME: {"password": self.PASSWORD}}}},
+            "verbose": 0,
+            "logging": {"enable": False},
+        }
+        self._server = wsgi.Server((self.host, self.port), WsgiDAVApp(config))
+        self._server.prepare()
+        self._thread = threading.Thread(target=self._server.serve, daemon=True, name="bench-webdav")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            self._thread.join(timeout=5)
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -1,42 +1,104 @@
 # ==== Datei: 01_Datei.py ====
 import streamlit as st
 import pandas as pd
-import base64
-import time
-import ast
+import calendar
+from datetime import date, timedelta
 from utils.data_manager import DataManager
-from utils.ui_helpers import apply_theme
-from utils.ui_helpers import apply_theme
-from PIL import Image
-import io
-
-def entferne_verwaiste_eintraege(df, data_key, word_handler, anhang_handler, data_manager):
-    neue_eintraege = []
-
-    for _, row in df.iterrows():
-        word_datei = row.get("dateiname", "")
-        anhaenge = row.get("anhaenge", [])
-
-        if isinstance(anhaenge, str):
-            try:
-                anhaenge = ast.literal_eval(anhaenge)
-            except:
-                anhaenge = []
-
-        word_exists = word_handler.exists(word_datei) if word_datei else True
-        all_attachments_exist = all(anhang_handler.exists(a) for a in anhaenge)
-
-        if word_exists and all_attachments_exist:
-            neue_eintraege.append(row)
-
-    if len(neue_eintraege) != len(df):
-        st.session_state[data_key] = pd.DataFrame(neue_eintraege)
-        data_manager.save_data(data_key)
-        st.success("Verwaiste Einträge wurden entfernt.")
-        return pd.DataFrame(neue_eintraege)
+from utils.export_jobs import get_export_queue
+from utils.schemas import CHEMIE_SCHEMA, HAEMATOLOGIE_SCHEMA, KLINISCHE_CHEMIE_SCHEMA
+from utils.assets import get_assets
+from utils.ui_helpers import WORD_MIME, apply_theme
+
+def entferne_verwaiste_eintraege(df, data_key, word_handler, anhang_handler, blob_store, data_manager):
+    if df.empty:
+        return df
+
+    # Word & PDF laufender, fehlgeschlagener oder unterbrochener Exporte existieren noch nicht,
+    # ihre Einträge sind trotzdem gültig. Vor Index & Listings lesen: ein Export, der
+    # dazwischen fertig wird, ist so entweder noch vorgemerkt oder schon gespeichert
+    ausstehend = get_export_queue().pending(st.session_state.get("username")) | data_manager.get_pending_exports().names()
+
+    # Index neu laden: Anhänge & PDFs aus anderen Tabs/Sessions sind sonst unbekannt
+    blob_store.refresh()
+
+    # Je Ordner nur ein Listing statt einer Abfrage pro Datei
+    word_dateien = word_handler.list_existing() | ausstehend
+    anhang_dateien = anhang_handler.list_existing() | ausstehend
+
+    # "anhaenge" ist dank Schema bereits eine Liste
+    word_exists = df["dateiname"].map(lambda d: d in word_dateien if d else True)
+    anhaenge_exist = df["anhaenge"].map(lambda anhaenge: all(blob_store.sha_for(a) or a in anhang_dateien for a in anhaenge))
+    gueltig = word_exists & anhaenge_exist
+
+    if not gueltig.all():
+        # Die Übersicht hält nur einen Teil der Spalten, gelöscht wird über den Dateinamen
+        verwaist = [d for d in df.loc[~gueltig, "dateiname"] if d]
+        if verwaist:
+            data_manager.delete_records(data_key, "dateiname", verwaist)
+            st.success("Verwaiste Einträge wurden entfernt.")
+        return df[gueltig].reset_index(drop=True)
     
     return df
 
+SEITENGROESSEN = [10, 25, 50, 100]
+
+def baue_zeilen(df):
+    # Anzeigedaten einmal je Datenstand aufbereiten, neueste Einträge zuerst
+    df = df.sort_values(["datum", "zeit"], ascending=False, na_position="last", kind="stable")
+    datum_text = df["datum"].dt.strftime("%Y-%m-%d").fillna("")
+    titel = df["titel"].fillna("")
+    return [
+        {
+            "idx": idx,
+            "titel": t,
+            "datum_text": d,
+            "semester": sem,
+            "dateiname": datei,
+            "anhaenge": list(dict.fromkeys(anhaenge)),
+        }
+        for idx, t, d, sem, datei, anhaenge in zip(df.index, titel, datum_text, df["semester"],
+                                                   df["dateiname"], df["anhaenge"])
+    ]
+
+def lade_zeilen(data_key, df, revision):
+    # Die Fassung im Session State gilt, solange Revision und Zeilenzahl übereinstimmen
+    stand = (revision, len(df))
+    cache = st.session_state.get(f"{data_key}_zeilen")
+    if cache is None or cache["stand"] != stand:
+        cache = {"stand": stand, "zeilen": baue_zeilen(df)}
+        st.session_state[f"{data_key}_zeilen"] = cache
+    return cache["zeilen"]
+
+ZEITRAEUME = ["Alle", "Diese Woche", "Dieses Semester", "Monat", "Von – bis"]
+
+def semester_zeitraum(tag):
+    # Frühjahrssemester Februar bis Juli, Herbstsemester August bis Januar
+    if 2 <= tag.month <= 7:
+        return date(tag.year, 2, 1), date(tag.year, 7, 31)
+    jahr = tag.year if tag.month >= 8 else tag.year - 1
+    return date(jahr, 8, 1), date(jahr + 1, 1, 31)
+
+def lade_anhang(anhang):
+    if blob_store.sha_for(anhang):
+        return blob_store.read(anhang)
+    return dh_anhang.read_binary(anhang)
+
+def datei_download(label, dateiname, lade_datei, mime, key):
+    # Dateien werden erst auf Klick geladen; bereitgehalten wird immer nur die zuletzt angeforderte
+    bereit = st.session_state.get("bereiter_download")
+    if bereit and bereit["key"] == key:
+        st.download_button(label=f"⬇️ {label}", data=bereit["data"], file_name=dateiname, mime=mime, key=key)
+    elif st.button(f"📥 {label}", key=f"laden_{key}"):
+        try:
+            daten = lade_datei()
+        except FileNotFoundError:
+            st.error(f"❌ Datei nicht gefunden: {dateiname}")
+        except Exception as e:  # Speicher-/WebDAV-Fehler betreffen nur diese Datei, die Seite läuft weiter
+            st.warning(f"⚠️ Datei konnte nicht geladen werden: {dateiname} ({e})")
+        else:
+            st.session_state["bereiter_download"] = {"key": key, "data": daten}
+            st.rerun()
+
 # ===== Login-Schutz =====
 if "authentication_status" not in st.session_state or not st.session_state["authentication_status"]:
     st.switch_page("/")
@@ -45,44 +107,21 @@ if "authentication_status" not in st.session_state or not st.session_state["auth
 # ===== Fachname lesen =====
 fach_key = st.session_state.get("fach", "").lower().strip()
 
-# ===== Session Cleanup für alte Einträge =====
-eintrag_keys = {
-    "chemie": "chemie_eintraege",
-    "haematologie": "haematologie_eintraege",
-    "klinische chemie": "klinische_eintraege"
-}
-eintrags_key = eintrag_keys.get(fach_key)
-if eintrags_key and eintrags_key in st.session_state:
-    del st.session_state[eintrags_key]
-
 # ===== Icons laden =====
-def load_icon_base64(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
+assets = get_assets()
 icons = {
-    "chemie": load_icon_base64("assets/adrenaline.png"),
-    "haematologie": load_icon_base64("assets/blood.png"),
-    "klinische chemie": load_icon_base64("assets/rna.png"),
-    "semester": load_icon_base64("assets/semester.png"),
-    "datum": load_icon_base64("assets/calendar.png"),
-    "suchen": load_icon_base64("assets/search.png"),
-    "ordner": load_icon_base64("assets/datei.png")
+    "chemie": assets.url("adrenaline"),
+    "haematologie": assets.url("blood"),
+    "klinische chemie": assets.url("rna"),
+    "semester": assets.url("semester"),
+    "datum": assets.url("calendar"),
+    "suchen": assets.url("search"),
+    "ordner": assets.url("datei")
 }
 
 
 # ===== Session-Daten =====
-from PIL import Image
-import io
-
-def load_icon_bytes(path):
-    with open(path, "rb") as image_file:
-        return image_file.read()
-
-icon_bytes = load_icon_bytes("assets/datei.png")
-icon_image = Image.open(io.BytesIO(icon_bytes))
-
-st.set_page_config(page_title="Fachansicht", page_icon=icon_image)
+st.set_page_config(page_title="Fachansicht", page_icon=assets.image("datei"))
 apply_theme()
 fach_key = st.session_state.get("fach", "").lower().strip()
 username = st.session_state.get("username")
@@ -104,7 +143,7 @@ fach_icon = icons.get(fach_key)
 st.markdown(f"""
 <h1 style='display: flex; align-items: center; gap: 20px; font-size: 36px;'>
     {fach}
-    <img src="data:image/png;base64,{fach_icon}" width="48">
+    <img src="{fach_icon}" width="48">
 </h1>
 """, unsafe_allow_html=True)
 
@@ -132,47 +171,39 @@ st.markdown("### Finde deine Einträge und lade sie herunter.")
 # ===== DataManager initialisieren =====
 data_manager = DataManager()
 dh = data_manager._get_data_handler(f"{ordner_pfade.get(fach_key)}/{username}")
+blob_store = data_manager.get_blob_store()
 
 # === Einträge & Anhänge laden ===
+# Die Übersicht braucht nur diese Spalten, die langen Freitexte werden nicht geladen.
+# Dank revalidate wird nur neu geladen, wenn sich die Daten auf dem Server geändert haben.
+UEBERSICHT_SPALTEN = ["titel", "datum", "zeit", "semester", "dateiname", "anhaenge"]
+
 if fach_key == "chemie":
     data_key = "chemie_eintraege"
-    data_manager.load_user_data(data_key, "data_chemie.csv", initial_value=[])
-    if data_key not in st.session_state or not isinstance(st.session_state[data_key], pd.DataFrame):
-        st.session_state[data_key] = pd.DataFrame()
+    data_manager.migrate_user_data("data_chemie.csv", "data_chemie.parquet", journal=True, schema=CHEMIE_SCHEMA)
+    data_manager.load_user_data(data_key, "data_chemie.parquet", initial_value=[], journal=True,
+                                schema=CHEMIE_SCHEMA, columns=UEBERSICHT_SPALTEN,
+                                revalidate=True, search=True)
     dh_anhang = data_manager._get_data_handler(f"anhang_chemie/{username}")
-    eintrags_df = pd.DataFrame(st.session_state[data_key])
-    eintrags_df = entferne_verwaiste_eintraege(eintrags_df, data_key, dh, dh_anhang, data_manager)
-    
-    if "semester" in eintrags_df.columns:
-        eintrags_df["semester"] = eintrags_df["semester"].astype(str).fillna("")
-    else:
-        eintrags_df["semester"] = ""
+    eintrags_df = entferne_verwaiste_eintraege(st.session_state[data_key], data_key, dh, dh_anhang, blob_store, data_manager)
 elif fach_key == "klinische chemie":
     data_key = "klinische_eintraege"
-    data_manager.load_user_data(data_key, f"data_klinische_chemie_{username}.csv", initial_value=[])
-    if data_key not in st.session_state or not isinstance(st.session_state[data_key], pd.DataFrame):
-        st.session_state[data_key] = pd.DataFrame()
+    data_manager.migrate_user_data(f"data_klinische_chemie_{username}.csv", f"data_klinische_chemie_{username}.parquet",
+                                   journal=True, schema=KLINISCHE_CHEMIE_SCHEMA)
+    data_manager.load_user_data(data_key, f"data_klinische_chemie_{username}.parquet", initial_value=[], journal=True,
+                                schema=KLINISCHE_CHEMIE_SCHEMA, columns=UEBERSICHT_SPALTEN,
+                                revalidate=True, search=True)
     dh_anhang = data_manager._get_data_handler(f"anhang_klinische_chemie/{username}")
-    eintrags_df = pd.DataFrame(st.session_state[data_key])
-    eintrags_df = entferne_verwaiste_eintraege(eintrags_df, data_key, dh, dh_anhang, data_manager)
-
-    if "semester" in eintrags_df.columns:
-        eintrags_df["semester"] = eintrags_df["semester"].astype(str).fillna("")
-    else:
-        eintrags_df["semester"] = ""
+    eintrags_df = entferne_verwaiste_eintraege(st.session_state[data_key], data_key, dh, dh_anhang, blob_store, data_manager)
 elif fach_key == "haematologie":
     data_key = "haematologie_eintraege"
-    data_manager.load_user_data(data_key, "data_haematologie.csv", initial_value=[])
-    if data_key not in st.session_state or not isinstance(st.session_state[data_key], pd.DataFrame):
-        st.session_state[data_key] = pd.DataFrame()
+    data_manager.migrate_user_data("data_haematologie.csv", "data_haematologie.parquet", journal=True,
+                                   schema=HAEMATOLOGIE_SCHEMA)
+    data_manager.load_user_data(data_key, "data_haematologie.parquet", initial_value=[], journal=True,
+                                schema=HAEMATOLOGIE_SCHEMA, columns=UEBERSICHT_SPALTEN,
+                                revalidate=True, search=True)
     dh_anhang = data_manager._get_data_handler(f"anhang_haematologie/{username}")
-    eintrags_df = pd.DataFrame(st.session_state[data_key])
-    eintrags_df = entferne_verwaiste_eintraege(eintrags_df, data_key, dh, dh_anhang, data_manager)
-
-    if "semester" in eintrags_df.columns:
-        eintrags_df["semester"] = eintrags_df["semester"].astype(str).fillna("")
-    else:
-        eintrags_df["semester"] = ""
+    eintrags_df = entferne_verwaiste_eintraege(st.session_state[data_key], data_key, dh, dh_anhang, blob_store, data_manager)
 
 # ==== Prüfung auf gültige Daten ====
 if eintrags_df.empty or "titel" not in eintrags_df.columns or "datum" not in eintrags_df.columns:
@@ -182,91 +213,111 @@ if eintrags_df.empty or "titel" not in eintrags_df.columns or "datum" not in ein
 # Semesterfilter mit Icon
 st.markdown(f"""
 <div style='display: flex; align-items: center; gap: 10px; font-size: 18px; margin-top: 20px;'>
-    <img src="data:image/png;base64,{icons['semester']}" width="26">
+    <img src="{icons['semester']}" width="26">
     <strong>Filter nach Semester</strong>
 </div>
 """, unsafe_allow_html=True)
-semester_filter = st.selectbox("", ["Alle", "1", "2", "3", "4", "5", "6"])
+# 📅 Datumsindex mit vorberechneten Zählern je Semester und Monat
+date_index = data_manager.get_date_index(data_key)
+semester_anzahl = date_index.facets["semester"]
+semester_filter = st.selectbox("", ["Alle", "1", "2", "3", "4", "5", "6"],
+                               format_func=lambda s: s if s == "Alle" else f"{s} ({semester_anzahl.get(s, 0)})")
+
+# Zeitraumfilter
+zeitraum = st.selectbox("Zeitraum", ZEITRAEUME)
+heute = date.today()
+start = ende = None
+if zeitraum == "Diese Woche":
+    start = heute - timedelta(days=heute.weekday())
+    ende = start + timedelta(days=6)
+elif zeitraum == "Dieses Semester":
+    start, ende = semester_zeitraum(heute)
+elif zeitraum == "Monat":
+    monat_anzahl = date_index.facets["monat"]
+    monate = sorted(monat_anzahl, reverse=True)
+    if monate:
+        monat = st.selectbox("Monat", monate, format_func=lambda m: f"{m[5:]}.{m[:4]} ({monat_anzahl[m]})")
+        jahr, nummer = int(monat[:4]), int(monat[5:])
+        start, ende = date(jahr, nummer, 1), date(jahr, nummer, calendar.monthrange(jahr, nummer)[1])
+elif zeitraum == "Von – bis":
+    col_von, col_bis = st.columns(2)
+    with col_von:
+        start = st.date_input("Von", value=heute - timedelta(days=30), format="DD.MM.YYYY")
+    with col_bis:
+        ende = st.date_input("Bis", value=heute, format="DD.MM.YYYY")
+datum_treffer = set(date_index.between(start, ende)) if start or ende else None
 
 # Suchfeld mit Icon
 st.markdown(f"""
 <div style='display: flex; align-items: center; gap: 10px; font-size: 18px; margin-top: 30px;'>
-    <img src="data:image/png;base64,{icons['suchen']}" width="26">
-    <strong>Suche nach Titel oder Datum</strong>
+    <img src="{icons['suchen']}" width="26">
+    <strong>Suche in allen Feldern</strong>
 </div>
 """, unsafe_allow_html=True)
-suchbegriff = st.text_input("", placeholder="z. B. Vitamin oder 2025-05-08").strip().lower()
+suchbegriff = st.text_input("", placeholder="z. B. Vitamin, Titration oder 08.05.2025").strip()
 
-# 🇨🇭 Unterstützung für Schweizer Format
-if "." in suchbegriff and len(suchbegriff) == 10:
-    try:
-        tag, monat, jahr = suchbegriff.split(".")
-        suchbegriff = f"{jahr}-{monat.zfill(2)}-{tag.zfill(2)}"
-    except:
-        pass
+# 🔎 Volltextindex: Wortanfänge genügen, Umlaute und Datumsformate (2025-05-08 / 08.05.2025) werden vereinheitlicht
+treffer = None
+if suchbegriff:
+    treffer = data_manager.get_search_index(data_key).search(suchbegriff)
+    # Einträge, deren PDF/Word-Anhänge den Suchbegriff enthalten
+    anhang_treffer = data_manager.get_attachment_index().search(suchbegriff)
 
-eintrags_df["suchtext"] = eintrags_df["titel"].str.lower() + " " + eintrags_df["datum"].astype(str)
+def passt_zur_suche(zeile):
+    return (treffer is None or zeile["dateiname"] in treffer
+            or any(anhang in anhang_treffer for anhang in zeile["anhaenge"]))
 
-# 🧠 Kombinierte Filterung
-gefiltert = eintrags_df.copy()
-if semester_filter != "Alle":
-    gefiltert = gefiltert[gefiltert["semester"] == semester_filter]
-if suchbegriff:
-    gefiltert = gefiltert[gefiltert["suchtext"].str.contains(suchbegriff, na=False)]
+# 🧾 Zeilen werden nur neu aufgebaut, wenn sich die Daten geändert haben
+zeilen = lade_zeilen(data_key, eintrags_df, data_manager.revision(data_key))
 
+sortierung = st.radio("Sortierung", ["Neueste zuerst", "Älteste zuerst"], horizontal=True)
+seitengroesse = st.selectbox("Einträge pro Seite", SEITENGROESSEN, index=1)
+if sortierung == "Älteste zuerst":
+    zeilen = zeilen[::-1]
 
-for _, row in gefiltert.iterrows():
+# 🧠 Kombinierte Filterung
+gefiltert = [z for z in zeilen
+             if (semester_filter == "Alle" or z["semester"] == semester_filter)
+             and (datum_treffer is None or z["dateiname"] in datum_treffer)
+             and passt_zur_suche(z)]
+
+# Bei geänderter Filterung wieder mit der ersten Seite beginnen
+ansicht = (data_key, semester_filter, start, ende, suchbegriff, sortierung, seitengroesse)
+if st.session_state.get("uebersicht_ansicht") != ansicht:
+    st.session_state["uebersicht_ansicht"] = ansicht
+    st.session_state["uebersicht_anzahl"] = seitengroesse
+anzahl = st.session_state["uebersicht_anzahl"]
+
+st.caption(f"{min(anzahl, len(gefiltert))} von {len(gefiltert)} Einträgen")
+
+for zeile in gefiltert[:anzahl]:
+    idx = zeile["idx"]
     col1, col2 = st.columns([6, 2])
     with col1:
         st.markdown(f"""
         <div style='display: flex; align-items: center; gap: 10px; font-size: 16px;'>
-            <img src="data:image/png;base64,{icons['datum']}" width="24">
-            <strong>{row['datum']}</strong> – <em>{row['titel']}</em>
+            <img src="{icons['datum']}" width="24">
+            <strong>{zeile['datum_text']}</strong> – <em>{zeile['titel']}</em>
         </div>
         """, unsafe_allow_html=True)
     with col2:
-        word_file = row.get("dateiname")
+        word_file = zeile["dateiname"]
         if word_file:
-            try:
-                file_data = dh.read_binary(word_file)
-                st.download_button(
-                    label="⬇️ Word öffnen",
-                    data=file_data,
-                    file_name=word_file,
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key=f"word_{word_file}"
-                )
-            except Exception as e:
-                st.warning(f"❌ Word-Datei fehlt: {e}")
+            datei_download("Word öffnen", word_file, lambda word_file=word_file: dh.read_binary(word_file),
+                           WORD_MIME, key=f"word_{idx}_{word_file}")
 
     # === Anhänge anzeigen ===
-    anhaenge = row.get("anhaenge", [])
-    if isinstance(anhaenge, str):
-        try:
-            anhaenge = ast.literal_eval(anhaenge)
-        except Exception:
-            anhaenge = []
-
-    if anhaenge:
+    if zeile["anhaenge"]:
         st.markdown("Zugehörige Anhänge:")
-        for anhang in list(dict.fromkeys(anhaenge)):
-            file_data = None
-            for _ in range(3):
-                try:
-                    file_data = dh_anhang.read_binary(anhang)
-                    break
-                except FileNotFoundError:
-                    time.sleep(1)
-            if file_data:
-                st.download_button(
-                    label=f"⬇️ {anhang}",
-                    data=file_data,
-                    file_name=anhang,
-                    mime="application/pdf" if anhang.endswith(".pdf") else "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key=f"anhang_{anhang}"
-                )
-            else:
-                st.error(f"❌ Anhang nicht gefunden: {anhang}")
+        for anhang in zeile["anhaenge"]:
+            datei_download(anhang, anhang, lambda anhang=anhang: lade_anhang(anhang),
+                           "application/pdf" if anhang.endswith(".pdf") else WORD_MIME,
+                           key=f"anhang_{idx}_{anhang}")
+
+if anzahl < len(gefiltert):
+    if st.button(f"Mehr laden ({len(gefiltert) - anzahl} weitere)"):
+        st.session_state["uebersicht_anzahl"] = anzahl + seitengroesse
+        st.rerun()
 
 # ==== Zurück zur Startseite ====
 if st.button("🔙 Zurück zur Übersicht"):
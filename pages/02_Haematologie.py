@@ -1,18 +1,15 @@
 import streamlit as st
 import pandas as pd
 import io
-import base64
+import re
 from datetime import datetime
-from docx import Document
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-import tempfile
-from PIL import Image
-from docx.shared import Inches
 import uuid
 from utils.data_manager import DataManager
-from utils.ui_helpers import apply_theme
+from utils.export_jobs import ERROR, get_export_queue, job_key
+from utils.export_renderers import render_haematologie
+from utils.schemas import HAEMATOLOGIE_SCHEMA
+from utils.assets import get_assets
+from utils.ui_helpers import apply_theme, zeige_export
 from PIL import Image, UnidentifiedImageError
 import os
 
@@ -21,35 +18,35 @@ st.set_page_config(page_title="Hämatologie", page_icon="🩸")
 apply_theme()
 data_manager = DataManager()
 username = st.session_state.get("username", "anonymous")
-data_manager.load_user_data("haematologie_eintraege", "data_haematologie.csv", initial_value=[])
+data_manager.migrate_user_data("data_haematologie.csv", "data_haematologie.parquet", journal=True, schema=HAEMATOLOGIE_SCHEMA)
+data_manager.load_user_data("haematologie_eintraege", "data_haematologie.parquet", initial_value=[], journal=True,
+                            schema=HAEMATOLOGIE_SCHEMA, search=True)
 
-# ==== Word & Anhang-Verzeichnisse vorbereiten ====
+# ==== Word-Verzeichnis & Blob-Store vorbereiten ====
 dh_word = data_manager._get_data_handler(f"word_haematologie/{username}")
-dh_img = data_manager._get_data_handler(f"bilder_haematologie/{username}")
-dh_docs = data_manager._get_data_handler(f"anhang_haematologie/{username}")
-for dh in [dh_word, dh_img, dh_docs]:
-    if not dh.filesystem.exists(dh.root_path):
-        dh.filesystem.makedirs(dh.root_path)
+if not dh_word.filesystem.exists(dh_word.root_path):
+    dh_word.filesystem.makedirs(dh_word.root_path)
+blob_store = data_manager.get_blob_store()
+export_queue = get_export_queue()
+export_cache = data_manager.get_export_cache()
+pending_exports = data_manager.get_pending_exports()
 
 # ==== Icon laden ====
-def load_icon_base64(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
-img_rbb = load_icon_base64("assets/red-blood-cells.png")
-img_neutro = load_icon_base64("assets/neutrophil.png")
-img_lympho = load_icon_base64("assets/lymphocyte.png")
-img_platelet = load_icon_base64("assets/platelet.png")
-img_title = load_icon_base64("assets/blood-count.png")
-img_blood = load_icon_base64("assets/blood.png")
-img_paper = load_icon_base64("assets/paperclip.png")
-img_pic = load_icon_base64("assets/picture.png")
+assets = get_assets()
+img_rbb = assets.url("red-blood-cells")
+img_neutro = assets.url("neutrophil")
+img_lympho = assets.url("lymphocyte")
+img_platelet = assets.url("platelet")
+img_title = assets.url("blood-count")
+img_blood = assets.url("blood")
+img_paper = assets.url("paperclip")
+img_pic = assets.url("picture")
 
 # ==== Zellzählung ====
 st.markdown(f"""
 <h1 style='display: flex; align-items: center; gap: 24px;'>
     Hämatologie
-    <img src='data:image/png;base64,{img_blood}' width='50'>
+    <img src='{img_blood}' width='50'>
 </h1>
 """, unsafe_allow_html=True)
 
@@ -150,11 +147,11 @@ for zelltyp in zelltypen:
 st.markdown("---")
 
 # ==== Zusatzbereiche: RBB, NG, LY, TH ====
-def render_section(title, img_b64, felder, key_prefix, sonstiges_key):
+def render_section(title, img_src, felder, key_prefix, sonstiges_key):
     st.markdown(f"""
     <h3 style='display: flex; align-items: center; gap: 10px;'>
         {title}
-        <img src='data:image/png;base64,{img_b64}' width='30'>
+        <img src='{img_src}' width='30'>
     </h3>
     """, unsafe_allow_html=True)
     for feld in felder:
@@ -190,7 +187,7 @@ if fehlende:
 # ==== Bild-Upload ====
 st.markdown(f"""
 <h3 style='display: flex; align-items: center; gap: 10px;'>
-    <img src='data:image/png;base64,{img_pic}' width='40'>
+    <img src='{img_pic}' width='40'>
     Mikroskopiebilder oder Befundbilder
 </h3>
 """, unsafe_allow_html=True)
@@ -199,16 +196,12 @@ temp_uploaded_images = []
 if uploaded_images:
         st.markdown("**Vorschau:**")
         valide_uploaded_images = []  
-        bestehende = [f["name"] for f in dh_img.filesystem.ls(dh_img.root_path)]
         for img in uploaded_images:
             st.image(img, use_container_width=True)
             name_clean = img.name.replace(" ", "_").replace("\u00e4", "ae").replace("\u00f6", "oe").replace("\u00fc", "ue")
-            if any(f.endswith(name_clean) for f in bestehende):
-                st.info(f"⏭️ Bild bereits vorhanden: {name_clean}")
-                continue
+            img_bytes = img.getvalue()
 
             try:
-                img_bytes = img.getvalue()
                 image_pil = Image.open(io.BytesIO(img_bytes))
                 st.text(f"{name_clean} – Größe: {image_pil.size}")
                 if image_pil.size[0] == 0 or image_pil.size[1] == 0:
@@ -223,7 +216,7 @@ if "valide_uploaded_images" not in locals():
 # ==== Datei-Upload ====
 st.markdown(f"""
 <h3 style='display: flex; align-items: center; gap: 10px;'>
-    <img src='data:image/png;base64,{img_paper}' width='40'>
+    <img src='{img_paper}' width='40'>
     Weitere Dateien (PDF, Word)
 </h3>
 """, unsafe_allow_html=True)
@@ -232,236 +225,97 @@ temp_uploads = [(f.name, f.getvalue()) for f in uploaded_docs] if uploaded_docs
 anhang_dateien = []
 
 # ==== Speichern & Exportieren ====
-if "haema_exported" not in st.session_state:
-    st.session_state["haema_exported"] = False
+def speichere_export(job):
+    # Läuft im Hintergrund, sobald Word und PDF erstellt sind
+    dh_word.save(job.word_name, job.word)
+    blob_store.put(job.pdf, job.pdf_name)
+    pending_exports.remove(job.word_name, job.pdf_name)
 
-if st.button("📂 Speichern und Exportieren") and not st.session_state["haema_exported"]:
-    st.session_state["haema_exported"] = True
+if st.button("📂 Speichern und Exportieren"):
     if not titel.strip():
         st.warning("Bitte einen Titel eingeben.")
         st.stop()
 
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-
-    # ==== Bilder speichern ====
-    for name, img_bytes in valide_uploaded_images:
-        dh_img.save(f"{timestamp}_{uuid.uuid4().hex}_{name}", img_bytes)
-
-    # ==== Anhänge speichern ====
-    for name, content in temp_uploads:
-        name_clean = name.replace(" ", "_")
-        filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{name_clean}"
-        dh_docs.save(filename, content)
-        anhang_dateien.append(filename)
-
-    # ==== Word erstellen ====
-    doc = Document()
-    doc.add_heading(f"Befund: {titel}", 0)
-    doc.add_paragraph(f"Datum: {datum.strftime('%d.%m.%Y')}")
-
-    # Zellzählung erfassen
-    doc.add_heading("Zellzählung", level=2)
-    table = doc.add_table(rows=1, cols=4)
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Zelltyp"
-    hdr_cells[1].text = "Zählung 1"
-    hdr_cells[2].text = "Zählung 2"
-    hdr_cells[3].text = "Durchschnitt"
-
-    for zelltyp in zelltypen:
-        z1 = st.session_state.get(f"{zelltyp}_z1", 0)
-        z2 = st.session_state.get(f"{zelltyp}_z2", 0)
-        avg = (z1 + z2) / 2
-        row_cells = table.add_row().cells
-        row_cells[0].text = zelltyp
-        row_cells[1].text = str(z1)
-        row_cells[2].text = str(z2)
-        row_cells[3].text = f"{avg:.1f}"
-
-    # Zusatzbereiche
-    def add_section_to_doc(title, felder, prefix, sonstiges_key):
-        doc.add_heading(title, level=2)
-        for feld in felder:
-            wert = st.session_state.get(f"{prefix}_{feld}", "-")
-            doc.add_paragraph(f"{feld}: {wert}")
-        doc.add_paragraph("Sonstiges:")
-        doc.add_paragraph(st.session_state.get(sonstiges_key, "-"))
-
-    add_section_to_doc("Rotes Blutbild", rb_felder, "rb", "rb_sonstiges")
-    add_section_to_doc("Neutrophile Granulozyten", gb_felder, "gb", "ng_sonstiges")
-    add_section_to_doc("Lymphozytenveränderungen", ly_felder, "ly", "lc_sonstiges")
-    add_section_to_doc("Thrombozyten", th_felder, "th", "th_sonstiges")
-
-    if valide_uploaded_images:
-        doc.add_page_break()
-        doc.add_heading("Bilder", level=2)
-
-        for name, img_bytes in valide_uploaded_images:
-            try:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img_file:
-                    tmp_img_file.write(img_bytes)
-                    tmp_img_file_path = tmp_img_file.name
-                doc.add_picture(tmp_img_file_path, width=Inches(4.5))
-                doc.add_paragraph(name)
-            except Exception as e:
-                st.warning(f"⚠️ Bild konnte nicht eingefügt werden: {name} ({e})")
-    from PIL import UnidentifiedImageError
-
-    word_buffer = io.BytesIO()
-    doc.save(word_buffer)
-    word_buffer.seek(0)
-    import re
-
     safe_titel = re.sub(r"[^\w\-_.]", "_", titel.strip())
     if not safe_titel:
         st.warning("Der Titel enthält keine gültigen Zeichen für einen Dateinamen.")
         st.stop()
 
-    filename_word = f"{timestamp}_{safe_titel}.docx"
-    dh_word.save(filename_word, word_buffer.getvalue())
-
-    # ==== PDF erstellen ====
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        c = canvas.Canvas(tmp_pdf.name, pagesize=A4)
-        x, y = 2 * cm, A4[1] - 2 * cm
-
-    # Titel & Datum
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(x, y, f"Befund: {titel}")
-        y -= 1.2 * cm
-        c.setFont("Helvetica", 12)
-        c.drawString(x, y, f"Datum: {datum.strftime('%d.%m.%Y')}")
-        y -= 1.5 * cm
-
-    # Zellzählung als Tabelle
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(x, y, "Zellzählung")
-        y -= 1 * cm
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(x, y, "Zelltyp")
-        c.drawString(x + 6 * cm, y, "Zählung 1")
-        c.drawString(x + 9 * cm, y, "Zählung 2")
-        c.drawString(x + 12 * cm, y, "Ø")
-        y -= 0.7 * cm
-        c.setFont("Helvetica", 12)
-
-        for zelltyp in zelltypen:
-            z1 = st.session_state.get(f"{zelltyp}_z1", 0)
-            z2 = st.session_state.get(f"{zelltyp}_z2", 0)
-            avg = (z1 + z2) / 2
-            c.drawString(x, y, zelltyp)
-            c.drawString(x + 6 * cm, y, str(z1))
-            c.drawString(x + 9 * cm, y, str(z2))
-            c.drawString(x + 12 * cm, y, f"{avg:.1f}")
-            y -= 0.5 * cm
-            if y < 3 * cm:
-                c.showPage()
-                y = A4[1] - 2 * cm
-
-        # Zusatzbereiche wie im Word-Dokument
-        def draw_section(c, x, y, title, felder, prefix, sonst_key):
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(x, y, title)
-            y -= 0.8 * cm
-            c.setFont("Helvetica", 12)
-            for feld in felder:
-                wert = st.session_state.get(f"{prefix}_{feld}", "-")
-                c.drawString(x, y, f"{feld}: {wert}")
-                y -= 0.5 * cm
-                if y < 3 * cm:
-                    c.showPage()
-                    y = A4[1] - 2 * cm
-            c.drawString(x, y, "Sonstiges:")
-            y -= 0.5 * cm
-            sonst_text = st.session_state.get(sonst_key, "-")
-            for line in sonst_text.splitlines():
-                c.drawString(x, y, line)
-                y -= 0.5 * cm
-                if y < 3 * cm:
-                    c.showPage()
-                    y = A4[1] - 2 * cm
-            y -= 1 * cm
-            return y
-
-        y = draw_section(c, x, y, "Rotes Blutbild", rb_felder, "rb", "rb_sonstiges")
-        y = draw_section(c, x, y, "Neutrophile Granulozyten", gb_felder, "gb", "ng_sonstiges")
-        y = draw_section(c, x, y, "Lymphozytenveränderungen", ly_felder, "ly", "lc_sonstiges")
-        y = draw_section(c, x, y, "Thrombozyten", th_felder, "th", "th_sonstiges")
-
-    # Bilder einfügen (robustere Version mit PIL)
-
-    if "valide_uploaded_images" in locals() and valide_uploaded_images:
-        c.showPage()
-        y = A4[1] - 2 * cm
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(x, y, "Bilder")
-        y -= 1.2 * cm
-
-        for name, img_bytes in valide_uploaded_images:
-            try:
-                # Bild öffnen mit PIL
-                image = Image.open(io.BytesIO(img_bytes))
-                image = image.convert("RGB")  # Für JPEG/PDF sicherstellen
-
-                # Temporär als PNG speichern
-                tmp_path = f"{tempfile.gettempdir()}/{uuid.uuid4().hex}.png"
-                image.save(tmp_path, format="PNG")
-
-                # Sicherheit: Breite/Höhe prüfen
-                if image.width == 0 or image.height == 0:
-                    raise ValueError("Bildgröße ist 0")
-
-                # Bild ins PDF zeichnen
-                c.drawImage(tmp_path, x, y - 7 * cm, width=12 * cm, height=6 * cm)
-                y -= 8 * cm
-                if y < 3 * cm:
-                    c.showPage()
-                    y = A4[1] - 2 * cm
-
-            except Exception as e:
-                st.warning(f"⚠️ Bild konnte nicht ins PDF eingefügt werden: {name} ({e})")
-  
-    c.save()
-
-    # PDF-Datei speichern
-    pdf_filename = f"{timestamp}_{safe_titel}.pdf"
-    with open(tmp_pdf.name, "rb") as f:
-        pdf_bytes = f.read()
-    dh_docs.save(pdf_filename, pdf_bytes)
-    anhang_dateien.append(pdf_filename)
-
-    from PIL import UnidentifiedImageError
-
-    # ==== Eintrag speichern ====
-    neuer_eintrag = {
+    payload = {
         "titel": titel,
-        "datum": datum.strftime("%Y-%m-%d"),
-        "anhaenge": anhang_dateien,
-        "dateiname": filename_word,
-        "pdfname": pdf_filename,   # <--- DAS FEHLT!
-        "zeit": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "datum": datum.strftime('%d.%m.%Y'),
+        "zellzaehlung": [(zelltyp, st.session_state.get(f"{zelltyp}_z1", 0), st.session_state.get(f"{zelltyp}_z2", 0))
+                         for zelltyp in zelltypen],
+        "abschnitte": [(title, [(feld, st.session_state.get(f"{prefix}_{feld}", "-")) for feld in felder],
+                        st.session_state.get(sonstiges_key, "-"))
+                       for title, felder, prefix, sonstiges_key in [
+                           ("Rotes Blutbild", rb_felder, "rb", "rb_sonstiges"),
+                           ("Neutrophile Granulozyten", gb_felder, "gb", "ng_sonstiges"),
+                           ("Lymphozytenveränderungen", ly_felder, "ly", "lc_sonstiges"),
+                           ("Thrombozyten", th_felder, "th", "th_sonstiges"),
+                       ]],
+        "bilder": valide_uploaded_images,
     }
 
-    neuer_eintrag["semester"] = str(semester)
-
-    df_neu = pd.DataFrame([neuer_eintrag])
-    if isinstance(st.session_state["haematologie_eintraege"], pd.DataFrame):
-        st.session_state["haematologie_eintraege"] = pd.concat([
-            st.session_state["haematologie_eintraege"], df_neu
-        ], ignore_index=True)
+    # Gleicher Inhalt (z. B. Doppelklick) startet keinen zweiten Export und keinen zweiten Eintrag
+    schluessel = job_key(username, "haematologie", payload, str(semester), temp_uploads)
+    # Wurde derselbe Inhalt schon einmal gerendert, kommen Word & PDF aus dem Export-Cache
+    cache_key = export_cache.key("haematologie", payload)
+    job = export_queue.find(schluessel)
+    if job is None:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+
+        # ==== Bilder & Anhänge gemeinsam speichern (gleicher Inhalt wird wiederverwendet) ====
+        bild_uploads = [(f"{timestamp}_{uuid.uuid4().hex}_{name}", img_bytes) for name, img_bytes in valide_uploaded_images]
+        neue_anhaenge = []
+        for name, content in temp_uploads:
+            bestehend = blob_store.name_for(blob_store.hash(content))
+            if bestehend:
+                anhang_dateien.append(bestehend)
+                continue
+            name_clean = name.replace(" ", "_")
+            neue_anhaenge.append((f"{timestamp}_{uuid.uuid4().hex[:8]}_{name_clean}", content))
+
+        refs, fehler = blob_store.put_many(bild_uploads + neue_anhaenge)
+        for name, e in fehler.items():
+            st.warning(f"⚠️ Datei konnte nicht gespeichert werden: {name} ({e})")
+        bild_refs = [ref for ref in refs[:len(bild_uploads)] if ref]
+        anhang_dateien += [name for name, _ in neue_anhaenge if name not in fehler]
+        # Text von PDF/Word-Anhängen wird im Hintergrund für die Suche extrahiert
+        data_manager.index_attachments([(name, content) for name, content in neue_anhaenge if name not in fehler])
+
+        # ==== Eintrag zuerst speichern, Word & PDF folgen im Hintergrund ====
+        filename_word = f"{timestamp}_{safe_titel}.docx"
+        pdf_filename = f"{timestamp}_{safe_titel}.pdf"
+        anhang_dateien.append(pdf_filename)
+        neuer_eintrag = {
+            "titel": titel,
+            "datum": datum.strftime("%Y-%m-%d"),
+            "anhaenge": anhang_dateien,
+            "bilder": bild_refs,
+            "dateiname": filename_word,
+            "pdfname": pdf_filename,
+            "zeit": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "semester": str(semester),
+        }
+        # Bis Word & PDF gespeichert sind, schützt die Vormerkung den Eintrag vor der Verwaist-Prüfung
+        pending_exports.add(filename_word, pdf_filename)
+        data_manager.append_record("haematologie_eintraege", neuer_eintrag)
+        st.success("✅ Eintrag gespeichert!")
+        job = export_queue.submit(schluessel, username, render_haematologie, payload,
+                                  filename_word, pdf_filename, speichere_export,
+                                  cache=export_cache, cache_key=cache_key)
+    elif job.status == ERROR:
+        # Eintrag existiert bereits, nur den Export wiederholen
+        job = export_queue.submit(schluessel, username, render_haematologie, payload,
+                                  job.word_name, job.pdf_name, speichere_export,
+                                  cache=export_cache, cache_key=cache_key)
     else:
-        st.session_state["haematologie_eintraege"] = df_neu
-
-    data_manager.save_data("haematologie_eintraege")
-    st.success("✅ Eintrag gespeichert!")
+        st.info("ℹ️ Dieser Eintrag wurde bereits gespeichert.")
+    st.session_state["haema_export"] = job.id
 
-    st.download_button("⬇️ Word herunterladen", data=word_buffer, file_name=filename_word,
-                       mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-    st.download_button("⬇️ PDF herunterladen", data=pdf_bytes, file_name=pdf_filename, mime="application/pdf")
+zeige_export("haema_export")
 
 # ==== Zurück ==== 
-st.session_state["haema_exported"] = False
-
 if st.button("🔙 Zurück zur Übersicht"):
-    st.session_state["haema_exported"] = False
     st.switch_page("pages/01_Datei.py")
\ No newline at end of file
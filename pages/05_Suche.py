@@ -0,0 +1,123 @@
+# ==== Datei: 05_Suche.py ====
+import streamlit as st
+import pandas as pd
+import yaml
+from utils.data_manager import DataManager
+from utils.schemas import CHEMIE_SCHEMA, HAEMATOLOGIE_SCHEMA, KLINISCHE_CHEMIE_SCHEMA
+from utils.search_index import SearchIndex
+from utils.ui_helpers import apply_theme
+
+st.set_page_config(page_title="Suche", page_icon="🔎")
+apply_theme()
+
+# ===== Login-Schutz =====
+if "authentication_status" not in st.session_state or not st.session_state["authentication_status"]:
+    st.switch_page("/")
+    st.stop()
+
+username = st.session_state.get("username")
+data_manager = DataManager()
+
+# ===== Fächer (wie in der Übersicht) =====
+UEBERSICHT_SPALTEN = ["titel", "datum", "zeit", "semester", "dateiname", "anhaenge"]
+FAECHER = {
+    "chemie": ("Chemie", "chemie_eintraege", "data_chemie", CHEMIE_SCHEMA),
+    "haematologie": ("Hämatologie", "haematologie_eintraege", "data_haematologie", HAEMATOLOGIE_SCHEMA),
+    "klinische chemie": ("Klinische Chemie", "klinische_eintraege", f"data_klinische_chemie_{username}",
+                         KLINISCHE_CHEMIE_SCHEMA),
+}
+ZELLATLAS = "zellatlas"
+MAX_TREFFER = 20
+
+def lade_indizes():
+    # Erst beim ersten Suchbegriff laden, die Seite selbst kostet nichts
+    indizes = {}
+    for fach, (_, data_key, datei, schema) in FAECHER.items():
+        data_manager.migrate_user_data(f"{datei}.csv", f"{datei}.parquet", journal=True, schema=schema)
+        data_manager.load_user_data(data_key, f"{datei}.parquet", initial_value=[], journal=True,
+                                    schema=schema, columns=UEBERSICHT_SPALTEN, revalidate=True, search=True)
+        indizes[fach] = data_manager.get_search_index(data_key)
+    indizes[ZELLATLAS] = data_manager.get_atlas_index()
+    return indizes
+
+def lade_gesamtindex(indizes):
+    # Der zusammengeführte Index wird nur neu aufgebaut, wenn sich einer der Teilindizes geändert hat
+    stand = tuple((quelle, id(index), index.revision) for quelle, index in indizes.items())
+    cache = st.session_state.get("gesamtindex")
+    if cache is None or cache["stand"] != stand:
+        cache = {"stand": stand, "index": SearchIndex.merge(indizes)}
+        st.session_state["gesamtindex"] = cache
+    return cache["index"]
+
+def eintraege_nach_anhang(fach, anhang_treffer):
+    # Einträge eines Fachs, deren Anhänge den Suchbegriff enthalten
+    df = st.session_state[FAECHER[fach][1]]
+    if df.empty:
+        return {}
+    return {datei: anhaenge for datei, anhaenge in zip(df["dateiname"], df["anhaenge"])
+            if datei and any(anhang in anhang_treffer for anhang in anhaenge)}
+
+# ===== Titel =====
+st.markdown("<h1>🔎 Alle Einträge durchsuchen</h1>", unsafe_allow_html=True)
+st.markdown("Durchsucht Chemie, Hämatologie, Klinische Chemie, den Zellatlas und die Texte deiner Anhänge.")
+
+suchbegriff = st.text_input("Suchbegriff", placeholder="z. B. Titration, Myelozyt oder 08.05.2025").strip()
+
+if suchbegriff:
+    indizes = lade_indizes()
+    ergebnisse = {}
+    for (quelle, doc_id), punkte in lade_gesamtindex(indizes).rank(suchbegriff):
+        ergebnisse.setdefault(quelle, {})[doc_id] = punkte
+
+    # Treffer in Anhängen zählen für die zugehörigen Einträge
+    anhang_treffer = dict(data_manager.get_attachment_index().rank(suchbegriff))
+    if anhang_treffer:
+        for fach in FAECHER:
+            for datei, anhaenge in eintraege_nach_anhang(fach, anhang_treffer).items():
+                punkte = max(anhang_treffer.get(anhang, 0) for anhang in anhaenge)
+                treffer = ergebnisse.setdefault(fach, {})
+                treffer[datei] = max(treffer.get(datei, 0), punkte)
+
+    if not any(ergebnisse.values()):
+        st.info("Keine Treffer gefunden.")
+
+    # ===== Ergebnisse nach Fach gruppiert, beste Treffer zuerst =====
+    for fach, (name, data_key, _, _) in FAECHER.items():
+        treffer = ergebnisse.get(fach)
+        if not treffer:
+            continue
+        df = st.session_state[data_key]
+        zeilen = {datei: (titel, datum) for datei, titel, datum in zip(df["dateiname"], df["titel"], df["datum"])}
+        st.markdown(f"### {name} ({len(treffer)})")
+        sortiert = sorted(treffer.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        for datei, _ in sortiert[:MAX_TREFFER]:
+            if datei not in zeilen:
+                continue
+            titel, datum = zeilen[datei]
+            datum_text = datum.strftime("%d.%m.%Y") if pd.notna(datum) else ""
+            col1, col2 = st.columns([6, 2])
+            with col1:
+                st.markdown(f"**{datum_text}** – *{titel}*")
+            with col2:
+                if st.button("Öffnen", key=f"oeffnen_{fach}_{datei}"):
+                    st.session_state["fach"] = fach
+                    st.switch_page("pages/01_Datei.py")
+
+    atlas_treffer = ergebnisse.get(ZELLATLAS)
+    if atlas_treffer:
+        st.markdown(f"### Zellatlas ({len(atlas_treffer)})")
+        # Nur die angezeigten Einträge werden geladen
+        dh_atlas = data_manager._get_data_handler(f"zellatlas_haematologie/{username}")
+        texte, _ = dh_atlas.read_many(list(atlas_treffer)[:MAX_TREFFER], binary=False)
+        for datei in list(atlas_treffer)[:MAX_TREFFER]:
+            if datei not in texte:
+                continue
+            data = yaml.safe_load(texte[datei]) or {}
+            beschreibung = str(data.get("beschreibung", ""))
+            st.markdown(f"**{data.get('typ', datei)}** – {beschreibung[:150]}")
+        if st.button("Zum Zellatlas"):
+            st.switch_page("pages/08_Zellatlas.py")
+
+# ==== Zurück zur Startseite ====
+if st.button("🔙 Zur Startseite"):
+    st.switch_page("Start.py")
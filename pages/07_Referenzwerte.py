@@ -1,21 +1,17 @@
 import streamlit as st
-import base64
+from utils.assets import get_assets
 from utils.ui_helpers import apply_theme
 
 st.set_page_config(page_title="Referenzwerte", page_icon="📊")
 apply_theme()
 
 # ==== Titel und Icon ====
-def load_icon_base64(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-    
-img_reference = load_icon_base64("assets/book.png")
+img_reference = get_assets().url("book")
 
 st.markdown(f"""
 <h1 style='display: flex; align-items: center; gap: 24px;'>
     Referenzwerte
-    <img src='data:image/png;base64,{img_reference}' width='50'>
+    <img src='{img_reference}' width='50'>
 </h1>
 """, unsafe_allow_html=True)
 
@@ -30,18 +26,44 @@ referenzbilder = {
     ]
 }
 
-# Bilder anzeigen
+# Bilder anzeigen: zuerst nur Vorschaubilder, das grosse Bild erst auf Wunsch
+referenz_assets = get_assets("files/images")
+
+def zeige_bild(name, tier):
+    url = referenz_assets.tier_url(name, tier)
+    if url:
+        st.markdown(f"<img src='{url}' style='width: 100%;'>", unsafe_allow_html=True)
+    else:
+        st.image(referenz_assets.bytes(name), use_container_width=True)
+
 for titel, bilder in referenzbilder.items():
     with st.expander(f"🗌 {titel}"):
-        for pfad in bilder:
-            st.image(pfad, use_container_width=True)
-            with open(pfad, "rb") as file:
-                btn = st.download_button(
+        spalten = st.columns(3)
+        for i, pfad in enumerate(bilder):
+            name = pfad.split("/")[-1]
+            with spalten[i % 3]:
+                zeige_bild(name, "thumbnail")
+                if st.button("🔍 Vergrössern", key=f"zoom_{name}"):
+                    st.session_state["referenz_zoom"] = name
+
+        zoom = st.session_state.get("referenz_zoom")
+        if zoom in [pfad.split("/")[-1] for pfad in bilder]:
+            zeige_bild(zoom, "preview")
+            col1, col2 = st.columns(2)
+            with col1:
+                # Die Originaldatei liegt einmal pro Prozess im Speicher
+                st.download_button(
                     label="📥 Bild herunterladen",
-                    data=file,
-                    file_name=pfad.split("/")[-1],
-                    mime="image/png"
+                    data=referenz_assets.bytes(zoom),
+                    file_name=zoom,
+                    mime="image/png",
+                    key=f"download_{zoom}"
                 )
+            with col2:
+                if st.button("Schliessen", key=f"schliessen_{zoom}"):
+                    st.session_state.pop("referenz_zoom")
+                    st.rerun()
+
 # Zurück-Button zur Datei-Übersicht (Klinische Chemie)
 if st.button("🔙 Zurück"):
     st.switch_page("pages/01_Datei.py")
@@ -3,30 +3,25 @@ import os
 import yaml
 import io
 from datetime import datetime
-from docx import Document
-from docx.shared import Inches
 from PIL import Image
-import tempfile
 from utils.data_manager import DataManager
+from utils.atlas_export import export_zellatlas
 from zoneinfo import ZoneInfo
 from os.path import basename
+from utils.assets import get_assets
 from utils.ui_helpers import apply_theme
-import base64
 
 # ==== Icon laden ====
-def load_icon_base64(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-    
-img_safe = load_icon_base64("assets/security.png")
-img_guide = load_icon_base64("assets/guideline.png")
-img_pic = load_icon_base64("assets/picture.png")
-img_load = load_icon_base64("assets/download.png")
+assets = get_assets()
+img_safe = assets.url("security")
+img_guide = assets.url("guideline")
+img_pic = assets.url("picture")
+img_load = assets.url("download")
 
 # === Setup ===
 st.set_page_config(
     page_title="Zellatlas Hämatologie",
-    page_icon="assets/guideline.png",  # ← Das ist der relative Pfad zur Datei
+    page_icon=assets.image("guideline"),
     layout="centered",
     initial_sidebar_state="collapsed"
 )
@@ -66,7 +61,7 @@ if "zell_eintraege" not in st.session_state:
 st.markdown(f"""
 <h1 style='display: flex; align-items: center; gap: 16px; margin-bottom: 0;'>
     Zellatlas Hämatologie
-    <img src='data:image/png;base64,{img_guide}' width='48'>
+    <img src='{img_guide}' width='48'>
 </h1>
 <p style='margin-top: 4px; font-size: 20px; text-decoration: underline; color: #333;'>
     Zell-Einträge erfassen
@@ -78,7 +73,7 @@ for idx, eintrag in enumerate(st.session_state.zell_eintraege):
     typ = st.selectbox("Zelltyp wählen", [f"{k}: {v}" for k in bereiche for v in bereiche[k]], key=f"typ_{idx}")
     st.markdown(f"""
     <h4 style='display: flex; align-items: center; gap: 10px; margin-top: 30px;'>
-        <img src='data:image/png;base64,{img_pic}' width='34'>
+        <img src='{img_pic}' width='34'>
         Bild hochladen (png/jpg)
     </h4>
     """, unsafe_allow_html=True)
@@ -136,6 +131,7 @@ if st.button("📂 Alle Einträge speichern"):
 
             yaml_name = f"{timestamp}_{eintrag['typ'].split(':')[1].strip().lower().replace(' ', '_')}.yaml"
             dh.write_text(yaml_name, yaml.dump(eintrag_data, allow_unicode=True))
+            data_manager.index_atlas_entry(yaml_name, eintrag_data)
             erfolgreich = True
 
     if erfolgreich:
@@ -147,7 +143,7 @@ if st.button("📂 Alle Einträge speichern"):
 # === Anzeige gespeicherter Einträge ===
 st.markdown(f"""
 <h2 style='display: flex; align-items: center; gap: 10px;'>
-    <img src='data:image/png;base64,{img_safe}' width='50'>
+    <img src='{img_safe}' width='50'>
     Gespeicherte Zell-Einträge
 </h2>
 """, unsafe_allow_html=True)
@@ -157,11 +153,35 @@ eintrags_liste = [
     if (f["name"] if isinstance(f, dict) else f).endswith(".yaml")
 ]
 
+# === YAML-Dateien und Bilder gesammelt (parallel) laden ===
+yaml_texte, atlas_fehler = dh.read_many([basename(f) for f in eintrags_liste], binary=False)
+atlas_daten = {}
+for name, text in yaml_texte.items():
+    try:
+        atlas_daten[name] = yaml.safe_load(text)
+    except Exception as e:
+        atlas_fehler[name] = e
+atlas_bilder, bild_fehler = dh.read_many(
+    [basename(d["bild"]) for d in atlas_daten.values() if isinstance(d, dict) and "bild" in d]
+)
+
+def lade_eintrag(filename):
+    name = basename(filename)
+    if name in atlas_fehler:
+        raise atlas_fehler[name]
+    return atlas_daten[name]
+
+def lade_bild(data):
+    name = basename(data["bild"])
+    if name in bild_fehler:
+        raise bild_fehler[name]
+    return atlas_bilder[name]
+
 if eintrags_liste:
     eintrags_liste.sort(reverse=True)
     for filename in eintrags_liste:
         try:
-            data = yaml.safe_load(dh.read_text(basename(filename)))
+            data = lade_eintrag(filename)
             st.markdown(f"### {data['typ']}")
             zeit_raw = data.get("zeit", "")
             try:
@@ -171,7 +191,7 @@ if eintrags_liste:
                 st.markdown(f"{zeit_raw}")
             st.markdown(data.get("beschreibung", "Keine Beschreibung vorhanden."))
             if "bild" in data:
-                st.image(dh.read_binary(basename(data["bild"])), width=300)
+                st.image(lade_bild(data), width=300)
 
             # === Lösch-Logik mit einfacher Bestätigung ===
             if st.button(f"🗑️ Löschen", key=f"delete_{filename}"):
@@ -188,6 +208,7 @@ if eintrags_liste:
                     if st.button("✅ Ja", key=f"confirm_{filename}"):
                         try:
                             dh.filesystem.delete(os.path.join(dh.root_path, basename(filename)))
+                            data_manager.remove_atlas_entries([basename(filename)])
                             if "bild" in data:
                                 bild_pfad = os.path.join(dh.root_path, basename(data["bild"]))
                                 if dh.filesystem.exists(bild_pfad):
@@ -204,105 +225,56 @@ else:
     st.info("Noch keine Einträge vorhanden.")
 
 # === Alle Einträge gemeinsam exportieren ===
-if eintrags_liste:
-    eintrags_liste.sort()  # Chronologische Reihenfolge
-
-    # === Word-Datei erstellen ===
-    doc = Document()
-    doc.add_heading("Zellatlas Hämatologie", 0)
-
-    for datei in eintrags_liste:
-        data = yaml.safe_load(dh.read_text(basename(datei)))
-        typ = data.get("typ", "Unbekannt")
-        beschreibung = data.get("beschreibung", "")
-        zeit_raw = data.get("zeit", "")
-        zeit_dt = datetime.fromisoformat(zeit_raw) if zeit_raw else datetime.now()
-        zeit_fmt = zeit_dt.strftime("%d.%m.%Y %H:%M")
-
-        doc.add_heading(f"{typ}", level=1)
-        doc.add_paragraph(f"Erstellt am: {zeit_fmt}")
-        doc.add_paragraph(beschreibung)
-
-        if "bild" in data:
-            try:
-                image_data = dh.read_binary(data["bild"])
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-                    tmp_img.write(image_data)
-                    doc.add_picture(tmp_img.name, width=Inches(4.5))
-            except Exception as e:
-                doc.add_paragraph(f"⚠️ Bild {data.get('bild', 'unbekannt')} konnte nicht eingefügt werden: {e}")
-
-        doc.add_paragraph("---")
-
-    word_buffer = io.BytesIO()
-    doc.save(word_buffer)
-    word_buffer.seek(0)
-
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-
-with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-    c = canvas.Canvas(tmp_pdf.name, pagesize=A4)
-    x, y = 2 * cm, A4[1] - 2 * cm
-
-    for datei in eintrags_liste[::-1]:  # ältester unten, neuester oben
-        data = yaml.safe_load(dh.read_text(basename(datei)))
-        typ = data.get("typ", "Unbekannt")
-        beschreibung = data.get("beschreibung", "")
-        zeit_raw = data.get("zeit", "")
-        zeit_dt = datetime.fromisoformat(zeit_raw) if zeit_raw else datetime.now()
-        zeit_fmt = zeit_dt.strftime("%d.%m.%Y %H:%M")
-
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(x, y, f"Zelltyp: {typ}")
-        y -= 1 * cm
-        c.setFont("Helvetica", 12)
-        c.drawString(x, y, f"Erstellt am: {zeit_fmt}")
-        y -= 1 * cm
-
-        for line in beschreibung.splitlines():
-            c.drawString(x, y, line.strip())
-            y -= 0.6 * cm
-            if y < 4 * cm:
-                c.showPage()
-                y = A4[1] - 2 * cm
-
-        # === Bild einfügen ===
-        if "bild" in data:
-            try:
-                image_data = dh.read_binary(data["bild"])
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-                    tmp_img.write(image_data)
-                    tmp_img.flush()
-                    c.drawImage(tmp_img.name, x, y - 6 * cm, width=10 * cm, height=6 * cm, preserveAspectRatio=True)
-                    y -= 7 * cm
-                    if y < 4 * cm:
-                        c.showPage()
-                        y = A4[1] - 2 * cm
-            except Exception as e:
-                c.drawString(x, y, f"⚠️ Bild {data.get('bild', 'unbekannt')} fehlerhaft: {str(e)}")
-                y -= 1 * cm
-
-        y -= 1 * cm  # Abstand zum nächsten Eintrag
-
-    c.save()
-    with open(tmp_pdf.name, "rb") as f:
-        pdf_data = f.read()
-
+def export_eintrag(name):
+    # Nur für Einträge, die noch nicht im Fragment-Cache sind; nutzt die oben geladenen Daten
+    data = atlas_daten[name]
+    zeit_raw = data.get("zeit", "")
+    try:
+        zeit = datetime.fromisoformat(zeit_raw).strftime("%d.%m.%Y %H:%M") if zeit_raw else ""
+    except (TypeError, ValueError):
+        zeit = str(zeit_raw)  # wie in der Anzeige: unbekannte Formate unverändert übernehmen
+    bild = None
+    if "bild" in data:
+        try:
+            bild = (basename(data["bild"]), lade_bild(data))
+        except Exception:
+            bild = (basename(data["bild"]), b"")  # wird im Dokument als fehlerhaft vermerkt
+    return {
+        "typ": data.get("typ", "Unbekannt"),
+        "zeit": zeit,
+        "beschreibung": data.get("beschreibung", ""),
+        "bild": bild,
+    }
 
-    # === Download-Buttons anzeigen ===
+if eintrags_liste:
     st.markdown("""
     <h2 style='text-decoration: underline; font-weight: bold; font-size: 28px; margin-top: 20px;'>
         Gesamten Zellatlas herunterladen
     </h2>
     """, unsafe_allow_html=True)
 
-    if 'word_buffer' in locals():
-        st.download_button("⬇️ Gesamtes Word-Dokument", data=word_buffer, file_name="Zellatlas_Haematologie.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    # Chronologische Reihenfolge; Einträge werden nie verändert, der Dateiname steht für den Inhalt
+    export_namen = [basename(datei) for datei in sorted(eintrags_liste) if basename(datei) in atlas_daten]
+
+    # Export nur auf Anfrage: bei neuen Einträgen werden nur diese an das zuletzt exportierte Dokument angehängt
+    export = st.session_state.get("zellatlas_export")
+    if export is not None and export["eintraege"] != export_namen:
+        export = None
+    if export is None and st.button("📄 Zellatlas exportieren"):
+        with st.spinner("Zellatlas wird exportiert …"):
+            word_data, pdf_data, warnungen = export_zellatlas(
+                data_manager.get_export_cache(), atlas_folder, export_namen, export_eintrag)
+        export = {"eintraege": export_namen, "word": word_data, "pdf": pdf_data, "warnungen": warnungen}
+        st.session_state["zellatlas_export"] = export
+
+    if export is not None:
+        for warnung in export["warnungen"]:
+            st.warning(f"⚠️ {warnung}")
+
+        # === Download-Buttons anzeigen ===
+        st.download_button("⬇️ Gesamtes Word-Dokument", data=export["word"], file_name="Zellatlas_Haematologie.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
 
-    if 'pdf_data' in locals():
-        st.download_button("⬇️ Gesamtes PDF-Dokument", data=pdf_data, file_name="Zellatlas_Haematologie.pdf", mime="application/pdf")
+        st.download_button("⬇️ Gesamtes PDF-Dokument", data=export["pdf"], file_name="Zellatlas_Haematologie.pdf", mime="application/pdf")
 
 # === Zurück zur Übersicht ===
 st.markdown("---")
@@ -0,0 +1,202 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+
+import streamlit as st
+from PIL import Image
+
+
+ASSET_FOLDER = "assets"
+STATIC_FOLDER = "static"  # served by Streamlit under app/static/ (server.enableStaticServing)
+ICON_FOLDER = "icons"
+ICON_PIXELS = 100  # icons are displayed at 24-50 px, this keeps them sharp on high-DPI screens
+REFERENCE_FOLDER = "files/images"
+IMAGE_TIERS = {"thumbnail": 320, "preview": 1400}  # longest side in px of the web-sized copies
+
+
+class AssetRegistry:
+    """
+    Process-wide cache of the icons in the `assets` folder.
+
+    Every icon is read from disk and base64-encoded once per process instead of on
+    every rerun of every session. A changed file is picked up on the next access
+    (its mtime is compared on each lookup), so icons can be replaced without a restart.
+
+    For HTML, icons are referenced by URL: url() writes a downsized copy of the icon
+    into the static folder, named after its content hash, so browsers can cache it
+    for good and a changed icon gets a new URL.
+
+        >>> assets = get_assets()
+        >>> assets.url("calendar")
+        'app/static/icons/calendar.100.3f2a9c01d4.png'
+    """
+
+    def __init__(self, folder=ASSET_FOLDER, static_folder=STATIC_FOLDER):
+        """
+        Args:
+            folder: Folder the icons are read from.
+            static_folder: Folder served by Streamlit's static file serving.
+        """
+        self.folder = folder
+        self.static_folder = static_folder
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        """
+        Returns the file path of an icon. Names without extension refer to .png files.
+        """
+        if not os.path.splitext(name)[1]:
+            name += ".png"
+        return os.path.join(self.folder, name)
+
+    def _entry(self, name):
+        path = self.path(name)
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._entries.get(path)
+        if entry is None or entry["mtime"] != mtime:
+            with open(path, "rb") as f:
+                content = f.read()
+            entry = {"mtime": mtime, "bytes": content}
+            with self._lock:
+                self._entries[path] = entry
+        return entry
+
+    def _derived(self, name, key, create):
+        entry = self._entry(name)
+        if key not in entry:
+            entry[key] = create(entry["bytes"])
+        return entry[key]
+
+    def bytes(self, name):
+        """
+        Returns the raw file content of an icon.
+
+        Raises:
+            FileNotFoundError: If the icon does not exist
+        """
+        return self._entry(name)["bytes"]
+
+    def base64(self, name):
+        """
+        Returns the base64-encoded content of an icon, e.g. for `data:image/png;base64,...` URLs.
+        """
+        return self._derived(name, "base64", lambda content: base64.b64encode(content).decode("utf-8"))
+
+    def image(self, name):
+        """
+        Returns an icon as decoded PIL image, e.g. for `st.set_page_config(page_icon=...)`.
+        """
+        def decode(content):
+            image = Image.open(io.BytesIO(content))
+            image.load()
+            return image
+        return self._derived(name, "image", decode)
+
+    def build_variant(self, name, pixels, subfolder=ICON_FOLDER, image_format="PNG"):
+        """
+        Writes a downsized copy of an image to the static folder, unless it already exists.
+
+        The file name contains the size and the content hash of the original, so a copy
+        never changes once written.
+
+        Args:
+            name: Name of the image in the asset folder.
+            pixels: Maximum width and height of the copy.
+            subfolder: Folder inside the static folder.
+            image_format: PIL format of the copy, e.g. "PNG" or "WEBP".
+
+        Returns:
+            The file name of the copy inside the static subfolder.
+        """
+        content = self.bytes(name)
+        stem = os.path.splitext(os.path.basename(self.path(name)))[0]
+        digest = hashlib.sha256(content).hexdigest()[:10]
+        file_name = f"{stem}.{pixels}.{digest}.{image_format.lower()}"
+        target = os.path.join(self.static_folder, subfolder, file_name)
+        if not os.path.exists(target):
+            image = Image.open(io.BytesIO(content))
+            image.thumbnail((pixels, pixels), Image.LANCZOS)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, format=image_format, optimize=True)
+            os.replace(tmp_path, target)
+        return file_name
+
+    def build_icon(self, name):
+        """
+        Writes the downsized static copy of an icon, see build_variant.
+        """
+        return self.build_variant(name, ICON_PIXELS)
+
+    def url(self, name):
+        """
+        Returns the URL of an icon for `<img src=...>` in st.markdown HTML.
+
+        Falls back to an inline `data:` URL if the static copy cannot be written.
+        """
+        def create(content):
+            try:
+                return f"app/static/{ICON_FOLDER}/{self.build_icon(name)}"
+            except OSError:
+                return f"data:image/png;base64,{self.base64(name)}"
+        return self._derived(name, "url", create)
+
+    def tier_url(self, name, tier):
+        """
+        Returns the URL of a web-sized WebP copy of a large image (see IMAGE_TIERS).
+
+        Args:
+            name: Name of the image in the asset folder.
+            tier: "thumbnail" or "preview".
+
+        Returns:
+            The app/static URL, or None if the copy cannot be written.
+        """
+        def create(content):
+            try:
+                return f"app/static/{tier}/{self.build_variant(name, IMAGE_TIERS[tier], tier, 'WEBP')}"
+            except (OSError, KeyError):  # KeyError: Pillow built without WebP support
+                return None
+        return self._derived(name, ("tier", tier), create)
+
+
+@st.cache_resource
+def get_assets(folder=ASSET_FOLDER):
+    """
+    Returns the AssetRegistry shared by all sessions of the process.
+    """
+    return AssetRegistry(folder)
+
+
+def _report(registry, file_name, subfolder, target):
+    before = os.path.getsize(registry.path(file_name))
+    after = os.path.getsize(os.path.join(registry.static_folder, subfolder, target))
+    print(f"{registry.path(file_name)}: {before / 1024:.0f} KB -> {subfolder}/{target} ({after / 1024:.1f} KB)")
+
+
+def build(folder=ASSET_FOLDER, reference_folder=REFERENCE_FOLDER, static_folder=STATIC_FOLDER):
+    """
+    Asset build step: writes the downsized static copies of all icons and the
+    thumbnail/preview tiers of the reference images ahead of time.
+
+        python -m utils.assets
+
+    Without it the copies are written on first use by the running app.
+    """
+    icons = AssetRegistry(folder, static_folder)
+    for file_name in sorted(os.listdir(folder)):
+        if file_name.lower().endswith(".png"):
+            _report(icons, file_name, ICON_FOLDER, icons.build_icon(file_name))
+
+    references = AssetRegistry(reference_folder, static_folder)
+    for file_name in sorted(os.listdir(reference_folder)):
+        if file_name.lower().endswith(".png"):
+            for tier, pixels in IMAGE_TIERS.items():
+                _report(references, file_name, tier, references.build_variant(file_name, pixels, tier, "WEBP"))
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,106 @@
+"""
+On-demand Word/PDF export of the cell atlas (see pages/08_Zellatlas.py).
+
+Atlas entries are never changed after saving: an entry is a YAML file with a
+timestamped name (plus its image) that is only ever deleted. The name therefore
+identifies the content, so the export needs to read neither YAML nor images to know
+whether it is up to date:
+
+- The section of every entry (with its decoded, downsized image) is kept in a
+  process-wide fragment cache and built only once.
+- The last exported atlas is kept in the user's ExportCache together with the names
+  of its entries. If entries were only added since, their sections are appended to
+  the cached documents instead of rendering the whole atlas again.
+
+    >>> word_bytes, pdf_bytes, warnings = export_zellatlas(cache, atlas_folder, namen, lade)
+"""
+import threading
+from collections import OrderedDict
+
+from utils.documents import ImageCache, Images, Report, render_docx, render_pdf
+from utils.export_renderers import ZELLATLAS_TITLE, zellatlas_section
+
+KIND = "zellatlas"
+MAX_FRAGMENT_BYTES = 64 * 1024 * 1024  # embedded image data kept per process, least recently used dropped first
+
+_fragments = OrderedDict()  # (folder, name) -> (section, size)
+_fragments_bytes = 0
+_fragments_lock = threading.Lock()
+
+
+def _size(section):
+    # The JPEG data dominates, text is small enough to ignore
+    return sum(len(image.data) for block in section.blocks if isinstance(block, Images) for image in block.images)
+
+
+def _fragment(folder, name, load):
+    """
+    Returns (section, warnings) of an atlas entry. Sections with warnings (e.g. an
+    image that could not be read) are not kept, the next export tries again.
+    """
+    global _fragments_bytes
+    key = (folder, name)
+    with _fragments_lock:
+        if key in _fragments:
+            _fragments.move_to_end(key)
+            return _fragments[key][0], []
+    images = ImageCache()
+    section = zellatlas_section(load(name), images)
+    size = _size(section)
+    if not images.warnings and size <= MAX_FRAGMENT_BYTES:
+        with _fragments_lock:
+            if key not in _fragments:
+                _fragments[key] = (section, size)
+                _fragments_bytes += size
+            while _fragments_bytes > MAX_FRAGMENT_BYTES:
+                _, (_, dropped) = _fragments.popitem(last=False)
+                _fragments_bytes -= dropped
+    return section, images.warnings
+
+
+def export_zellatlas(cache, folder, names, load):
+    """
+    Export the cell atlas of a user as Word and PDF.
+
+    Args:
+        cache: ExportCache of the user.
+        folder: Atlas folder of the user, scopes the fragment cache.
+        names: YAML file names of the entries in the order they appear in the document.
+        load: Function returning the entry dict (see zellatlas_section) of a YAML file
+            name. Only called for entries whose section is not cached yet.
+
+    Returns:
+        A (word bytes, pdf bytes, warnings) tuple.
+    """
+    names = list(names)
+    key = cache.key(KIND, folder, names)
+    cached = cache.get(key)
+    if cached is not None:
+        return (*cached, [])
+
+    # Base: the last export, if the atlas only got new entries since
+    base_key, base, neue = None, None, names
+    latest = cache.latest(KIND)
+    if latest is not None:
+        base_key, meta = latest
+        vorher = meta.get("eintraege", [])
+        # The key check also rules out bases of another folder or renderer version
+        if vorher and names[:len(vorher)] == vorher and cache.key(KIND, folder, vorher) == base_key:
+            base = cache.get(base_key)
+            if base is not None:
+                neue = names[len(vorher):]
+
+    report = Report(ZELLATLAS_TITLE)
+    warnings = []
+    for name in neue:
+        section, section_warnings = _fragment(folder, name, load)
+        report.sections.append(section)
+        warnings.extend(section_warnings)
+
+    word_base, pdf_base = base if base is not None else (None, None)
+    word, pdf = render_docx(report, base=word_base), render_pdf(report, base=pdf_base)
+    if not warnings:
+        cache.put(key, word, pdf, meta={"kind": KIND, "eintraege": names})
+        if base_key not in (None, key):
+            cache.remove(base_key)  # superseded, the new export is the base of the next one
+    return word, pdf, warnings
@@ -0,0 +1,195 @@
+import hashlib
+import threading
+
+
+_index_lock = threading.Lock()  # serializes the read-merge-write of hash indexes within the process
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded images and attachments.
+
+    Blobs are stored once per content under `blobs/<sha[:2]>/<sha>` in the app root,
+    so identical files uploaded by several users only take up space once. Every user
+    has a small hash index (`blob_index.json` in the user data folder) that maps the
+    hashes of their blobs to the file names used in their entries, which makes
+    duplicate detection a dictionary lookup instead of a directory listing.
+
+    Several sessions (tabs, the export worker) can write the same index. Every write
+    therefore reloads the stored index and merges its own additions into it instead
+    of saving the possibly outdated in-memory copy; refresh() picks up additions of
+    other sessions before the index is relied on, e.g. for the orphan check.
+
+        >>> blob_store = data_manager.get_blob_store()
+        >>> sha = blob_store.put(content, "20250508_protokoll.pdf")
+        >>> blob_store.contains(sha)
+        True
+    """
+
+    INDEX_FILE = "blob_index.json"
+
+    def __init__(self, blob_handler, user_handler):
+        """
+        Initialize the blob store.
+
+        Args:
+            blob_handler: DataHandler for the shared blob folder.
+            user_handler: DataHandler for the user's data folder holding the hash index.
+        """
+        self.blob_handler = blob_handler
+        self.user_handler = user_handler
+        self.index = self._load_index()
+
+    def _load_index(self):
+        return self.user_handler.load(self.INDEX_FILE, initial_value={"blobs": {}, "names": {}})
+
+    def refresh(self):
+        """
+        Reload the hash index from storage, including blobs stored by other sessions.
+        """
+        index = self._load_index()
+        with _index_lock:
+            self.index = index
+
+    def _register(self, entries):
+        """
+        Add (sha, name, size) entries to the stored index: the index is reloaded, merged
+        and saved under the process-wide lock, so additions of other sessions are kept.
+        """
+        with _index_lock:
+            index = self._load_index()
+            changed = False
+            for sha, name, size in entries:
+                if sha not in index["blobs"]:
+                    index["blobs"][sha] = {"name": name, "size": size}
+                    changed = True
+                if index["names"].get(name) != sha:
+                    index["names"][name] = sha
+                    changed = True
+            if changed:
+                self.user_handler.save(self.INDEX_FILE, index)
+            self.index = index
+
+    @staticmethod
+    def hash(content):
+        """
+        Compute the SHA-256 hex digest used as blob address.
+
+        Args:
+            content: The binary content.
+
+        Returns:
+            The hex digest as string.
+        """
+        return hashlib.sha256(content).hexdigest()
+
+    def _blob_path(self, sha):
+        return self.blob_handler.join(sha[:2], sha)
+
+    def contains(self, sha):
+        """
+        Check whether the user already stored a blob with the given hash.
+
+        Args:
+            sha: The SHA-256 hex digest.
+
+        Returns:
+            True if the blob is referenced in the user's index, False otherwise.
+        """
+        return sha in self.index["blobs"]
+
+    def name_for(self, sha):
+        """
+        Return the file name the user stored a blob under, or None.
+        """
+        entry = self.index["blobs"].get(sha)
+        return entry["name"] if entry else None
+
+    def sha_for(self, name):
+        """
+        Return the hash of the blob stored under a file name, or None for files outside the blob store.
+        """
+        return self.index["names"].get(name)
+
+    def put(self, content, name):
+        """
+        Store content and register it under a file name in the user's index.
+
+        The blob itself is only uploaded if no user has stored the same content before.
+
+        Args:
+            content: The binary content.
+            name: The file name the entry refers to.
+
+        Returns:
+            The SHA-256 hex digest of the content.
+        """
+        sha = self.hash(content)
+        blob_path = self._blob_path(sha)
+        if not self.blob_handler.exists(blob_path):
+            self.blob_handler.save(blob_path, content)
+
+        if sha not in self.index["blobs"] or self.index["names"].get(name) != sha:
+            self._register([(sha, name, len(content))])
+        return sha
+
+    def put_many(self, items):
+        """
+        Store several files at once, uploading missing blobs concurrently.
+
+        Args:
+            items: List of (name, content) tuples.
+
+        Returns:
+            A tuple (shas, errors): shas lists the SHA-256 digests of the stored items in
+            input order (None for failed items), errors maps names that failed to the exception.
+        """
+        hashed = [(name, content, self.hash(content)) for name, content in items]
+        blob_paths = {self._blob_path(sha): content for _, content, sha in hashed}
+        existing, _ = self.blob_handler.exists_many(blob_paths)
+        missing = {path: content for path, content in blob_paths.items() if not existing.get(path)}
+        _, write_errors = self.blob_handler.write_many(missing)
+
+        shas, errors, entries = [], {}, []
+        for name, content, sha in hashed:
+            error = write_errors.get(self._blob_path(sha))
+            if error is not None:
+                errors[name] = error
+                shas.append(None)
+                continue
+            entries.append((sha, name, len(content)))
+            shas.append(sha)
+        if entries:
+            self._register(entries)
+        return shas, errors
+
+    def get(self, sha):
+        """
+        Read the content of a blob.
+
+        Args:
+            sha: The SHA-256 hex digest.
+
+        Returns:
+            The content as bytes.
+        """
+        # Blobs never change, a cached copy is always valid
+        return self.blob_handler.read_binary(self._blob_path(sha), revalidate=False)
+
+    def read(self, name):
+        """
+        Read the blob stored under a file name.
+
+        Args:
+            name: The file name the entry refers to.
+
+        Returns:
+            The content as bytes.
+
+        Raises:
+            FileNotFoundError: If no blob is registered under the name.
+        """
+        sha = self.sha_for(name)
+        if sha is None:
+            raise FileNotFoundError(f"No blob registered for: {name}")
+        return self.get(sha)
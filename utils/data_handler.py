@@ -1,18 +1,50 @@
-import json, yaml, posixpath
+import json, yaml, posixpath, threading, time, uuid
 import pandas as pd
-from io import StringIO
+from utils import metrics
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
 
 class DataHandler:
-    def __init__(self, filesystem, root_path):
+    # Compression codec for .parquet files
+    PARQUET_COMPRESSION = "zstd"
+
+    # Number of journal segments after which a background compaction is started
+    JOURNAL_COMPACT_THRESHOLD = 20
+
+    # Attempts of read_journal to get a consistent read while a compaction replaces the base file
+    JOURNAL_READ_ATTEMPTS = 5
+    JOURNAL_RETRY_DELAY = 0.1  # seconds, multiplied by the attempt number
+
+    # Upper bound of concurrent requests issued by the *_many methods (shared by all handlers)
+    BULK_MAX_WORKERS = 8
+
+    _compaction_lock = threading.Lock()
+    _compactions_running = set()
+    _journal_locks = {}
+    _bulk_lock = threading.Lock()
+    _bulk_executor = None
+
+    def __init__(self, filesystem, root_path, cache=None):
         """
         Initialize the DataHandler with an fsspec filesystem and a root path.
 
         Args:
             filesystem: An fsspec-compatible filesystem object.
             root_path: The root directory for file operations.
+            cache: Optional DiskCache used by read_binary to serve unchanged files locally.
         """
         self.filesystem = filesystem
         self.root_path = root_path
+        self.cache = cache
+
+    @property
+    def metrics_folder(self):
+        """
+        Label of the subject folder for storage metrics, e.g. 'word_chemie'. User names are left out.
+        """
+        parts = self.root_path.strip("/").split("/")
+        folder = parts[1] if len(parts) > 1 else parts[0]
+        return "user_data" if folder.startswith("user_data_") else folder
 
     def join(self, *args):
         return posixpath.join(*args)
@@ -29,6 +61,7 @@ class DataHandler:
         """
         return self.join(self.root_path, relative_path)
 
+    @metrics.timed("exists")
     def exists(self, relative_path):
         """
         Check if a file exists.
@@ -42,6 +75,109 @@ class DataHandler:
         full_path = self._resolve_path(relative_path)
         return self.filesystem.exists(full_path)
 
+    def list_existing(self, relative_path=""):
+        """
+        List all files below a directory with a single recursive listing.
+
+        Use this instead of calling exists() per file when many paths have to be checked.
+
+        Args:
+            relative_path: The directory relative to the root directory (default: the root itself).
+
+        Returns:
+            A set of file paths relative to the given directory. Empty if the directory does not exist.
+        """
+        full_path = self._resolve_path(relative_path).rstrip("/")
+        if not self.filesystem.exists(full_path):
+            return set()
+        # find() returns normalized paths, so normalize the prefix the same way
+        prefix = self.filesystem._strip_protocol(full_path).lstrip("/") + "/"
+        existing = set()
+        for path in self.filesystem.find(full_path):
+            path = path.lstrip("/")
+            existing.add(path[len(prefix):] if path.startswith(prefix) else posixpath.basename(path))
+        return existing
+
+    @classmethod
+    def _get_bulk_executor(cls):
+        with cls._bulk_lock:
+            if cls._bulk_executor is None:
+                cls._bulk_executor = ThreadPoolExecutor(max_workers=cls.BULK_MAX_WORKERS,
+                                                        thread_name_prefix="datahandler-bulk")
+            return cls._bulk_executor
+
+    def _run_many(self, func, items):
+        """
+        Run func for every item concurrently and collect results and errors per item.
+
+        Args:
+            func: Callable taking one item.
+            items: Iterable of hashable items (usually relative paths).
+
+        Returns:
+            A tuple (results, errors) of dicts mapping each item to its result or exception.
+        """
+        items = list(dict.fromkeys(items))
+        results, errors = {}, {}
+        if not items:
+            return results, errors
+        if len(items) == 1:  # no need to hand a single request to the pool
+            try:
+                results[items[0]] = func(items[0])
+            except Exception as e:
+                errors[items[0]] = e
+            return results, errors
+
+        executor = self._get_bulk_executor()
+        futures = {item: executor.submit(func, item) for item in items}
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                errors[item] = e
+        return results, errors
+
+    def exists_many(self, relative_paths):
+        """
+        Check concurrently which files exist.
+
+        Args:
+            relative_paths: Paths relative to the root directory.
+
+        Returns:
+            A tuple (results, errors): results maps each path to True/False, errors maps
+            paths whose check failed to the exception.
+        """
+        return self._run_many(self.exists, relative_paths)
+
+    def read_many(self, relative_paths, binary=True):
+        """
+        Read several files concurrently.
+
+        Args:
+            relative_paths: Paths relative to the root directory.
+            binary: Read bytes (default) or text.
+
+        Returns:
+            A tuple (results, errors): results maps each path to its content, errors maps
+            paths that could not be read to the exception.
+        """
+        return self._run_many(self.read_binary if binary else self.read_text, relative_paths)
+
+    def write_many(self, contents):
+        """
+        Save several files concurrently, using save() for each file.
+
+        Args:
+            contents: Dict mapping paths relative to the root directory to their content.
+
+        Returns:
+            A tuple (results, errors): results contains the paths that were written
+            (mapped to None), errors maps paths that failed to the exception.
+        """
+        return self._run_many(lambda path: self.save(path, contents[path]), contents)
+
+    @metrics.timed("read_text", count_bytes="result")
     def read_text(self, relative_path):
         """
         Read the contents of a text file.
@@ -56,20 +192,44 @@ class DataHandler:
         with self.filesystem.open(full_path, "r") as f:
             return f.read()
 
-    def read_binary(self, relative_path):
+    @metrics.timed("read_binary", count_bytes="result")
+    def read_binary(self, relative_path, revalidate=True):
         """
         Read the contents of a binary file.
 
+        If a cache is configured, the remote version (ETag, or mtime and size) is
+        checked first and an unchanged file is served from the local cache.
+
         Args:
             relative_path: The path relative to the root directory.
+            revalidate: Check the remote version before using a cached copy. Pass
+                False for immutable files, e.g. content-addressed blobs.
 
         Returns:
             The content of the file as bytes.
         """
         full_path = self._resolve_path(relative_path)
-        with self.filesystem.open(full_path, "rb") as f:
-            return f.read()
+        if self.cache is None:
+            with self.filesystem.open(full_path, "rb") as f:
+                return f.read()
 
+        version = self._remote_version(full_path) if revalidate else None
+        data = self.cache.get(full_path, version)
+        if data is None:
+            with self.filesystem.open(full_path, "rb") as f:
+                data = f.read()
+            self.cache.put(full_path, version if version is not None else "immutable", data)
+        return data
+
+    def _remote_version(self, full_path):
+        info = self.filesystem.info(full_path)
+        etag = info.get("etag")
+        if etag:
+            return f"etag:{etag}"
+        mtime = info.get("modified", info.get("mtime", info.get("created")))
+        return f"{mtime}:{info.get('size')}"
+
+    @metrics.timed("write_text", count_bytes="content")
     def write_text(self, relative_path, content):
         """
         Write text content to a file.
@@ -82,6 +242,7 @@ class DataHandler:
         with self.filesystem.open(full_path, "w") as f:
             f.write(content)
 
+    @metrics.timed("write_binary", count_bytes="content")
     def write_binary(self, relative_path, content):
         """
         Write binary content to a file.
@@ -94,14 +255,17 @@ class DataHandler:
         with self.filesystem.open(full_path, "wb") as f:
             f.write(content)
 
-    def load(self, relative_path, initial_value=None, **load_args):
+    @metrics.timed("load")
+    def load(self, relative_path, initial_value=None, columns=None, **load_args):
         """
         Load data from a file based on its extension.
 
         Args:
             relative_path: The path relative to the root directory.
             initial_value: The value to return if the file does not exist. If None, raises FileNotFoundError.
-            **load_args: Additional arguments to pass to the file loader (pd.read_csv).
+            columns: Optional list of columns to load from table files (.csv, .parquet). Columns
+                missing in the file are ignored. For .parquet only these columns are downloaded.
+            **load_args: Additional arguments to pass to the file loader (pd.read_csv / pd.read_parquet).
         Returns:
             Parsed data (e.g., DataFrame, dict, str, bytes) depending on the file type, or the initial value if provided.
         """
@@ -119,12 +283,32 @@ class DataHandler:
             text = self.read_text(relative_path)
             if not text.strip():
                 return initial_value if isinstance(initial_value, pd.DataFrame) else pd.DataFrame(initial_value)
+            if columns is not None:
+                load_args = {**load_args, "usecols": lambda col: col in columns}
             return pd.read_csv(StringIO(text), **load_args)
+        elif ext == ".parquet":
+            return self._read_parquet(relative_path, columns, **load_args)
         elif ext == ".txt":
             return self.read_text(relative_path)
         else:
             return self.read_binary(relative_path)
 
+    def _read_parquet(self, relative_path, columns=None, **load_args):
+        """
+        Read a parquet file. The file is opened lazily, so with a column projection
+        only the file footer and the requested column chunks are transferred.
+        """
+        import pyarrow.parquet as pq
+
+        full_path = self._resolve_path(relative_path)
+        with self.filesystem.open(full_path, "rb") as f:
+            parquet_file = pq.ParquetFile(f)
+            if columns is not None:
+                available = parquet_file.schema_arrow.names
+                columns = [col for col in columns if col in available]
+            return parquet_file.read(columns=columns, **load_args).to_pandas()
+
+    @metrics.timed("save")
     def save(self, relative_path, content):
         """
         Save data to a file based on its extension.
@@ -147,6 +331,10 @@ class DataHandler:
 
         if isinstance(content, pd.DataFrame) and ext == ".csv":
             self.write_text(relative_path, content.to_csv(index=False))
+        elif isinstance(content, pd.DataFrame) and ext == ".parquet":
+            buffer = BytesIO()
+            content.to_parquet(buffer, index=False, compression=self.PARQUET_COMPRESSION)
+            self.write_binary(relative_path, buffer.getvalue())
         elif isinstance(content, (dict, list)) and ext == ".json":
             self.write_text(relative_path, json.dumps(content, indent=4))
         elif isinstance(content, (dict, list)) and ext in [".yaml", ".yml"]:
@@ -157,3 +345,228 @@ class DataHandler:
             self.write_binary(relative_path, content)
         else:
             raise ValueError(f"Unsupported content type for extension {ext}")
+
+    def version(self, relative_path, journal=False):
+        """
+        Return a cheap fingerprint of the stored state of a file without downloading it.
+
+        Args:
+            relative_path: The path relative to the root directory.
+            journal: Include the pending journal segments of the file.
+
+        Returns:
+            A hashable value that changes whenever the file (or its journal) changes.
+        """
+        full_path = self._resolve_path(relative_path)
+        base_version = self._remote_version(full_path) if self.filesystem.exists(full_path) else None
+        if not journal:
+            return base_version
+        return (base_version, tuple(self._list_journal(relative_path)))
+
+    def _journal_dir(self, relative_path):
+        return relative_path + ".journal"
+
+    def _folded_file(self, relative_path):
+        # Kept next to the journal directory, whose .json files are all segments
+        return relative_path + ".folded.json"
+
+    def journal_lock(self, relative_path):
+        """
+        Return the process-wide lock of a journaled file.
+
+        Every compaction of the file runs under it. Callers that read the table, change
+        it and write it back with compact_journal hold it for the whole cycle, so no
+        other compaction can write in between:
+
+            >>> with dh.journal_lock("data_chemie.parquet"):
+            ...     data, segments = dh.read_journal("data_chemie.parquet")
+            ...     dh.compact_journal("data_chemie.parquet", changed(data), segments=segments)
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+
+        Returns:
+            A reentrant lock.
+        """
+        key = self._resolve_path(relative_path)
+        with DataHandler._compaction_lock:
+            return DataHandler._journal_locks.setdefault(key, threading.RLock())
+
+    def _list_journal(self, relative_path):
+        """
+        List the journal segments of a file in append order.
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+
+        Returns:
+            A sorted list of segment paths relative to the root directory.
+        """
+        journal_dir = self._journal_dir(relative_path)
+        full_path = self._resolve_path(journal_dir)
+        if not self.filesystem.exists(full_path):
+            return []
+        names = [posixpath.basename(f) for f in self.filesystem.ls(full_path, detail=False)]
+        return [self.join(journal_dir, n) for n in sorted(names) if n.endswith(".json")]
+
+    def append_journal(self, relative_path, record, schema=None):
+        """
+        Append a single record to the journal of a table file without rewriting the table.
+
+        The record is written as a small JSON segment next to the file. Once
+        JOURNAL_COMPACT_THRESHOLD segments have accumulated, they are folded into
+        the base file in a background thread.
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+            record: The record to append (dict).
+            schema: Optional TableSchema used to store the table during compaction.
+
+        Returns:
+            The path of the new segment relative to the root directory.
+        """
+        segment = self.join(self._journal_dir(relative_path),
+                            f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}.json")
+        self.save(segment, record)
+
+        if len(self._list_journal(relative_path)) >= self.JOURNAL_COMPACT_THRESHOLD:
+            self.compact_journal_async(relative_path, schema)
+        return segment
+
+    def read_journal(self, relative_path, initial_value=None, columns=None, **load_args):
+        """
+        Load a journaled table file and fold all pending journal segments into it.
+
+        A compaction records the segments it folds together with the version of the
+        base file it replaces (`<file>.folded.json`) before it writes the new base and
+        removes the segments. Once the base differs from that version, the recorded
+        segments are skipped, so a read between writing the base and removing the
+        segments does not count their records twice. If the base, the record or the
+        segments changed while reading, the read is repeated. The segments are read
+        concurrently.
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+            initial_value: The value to return if neither the file nor any segment exists.
+            columns: Optional list of columns to load (see load).
+            **load_args: Additional arguments to pass to the file loader.
+
+        Returns:
+            A tuple (data, segments): the base table with all journal records appended as
+            DataFrame (or the initial value if there is nothing stored yet), and the
+            segments that were folded in.
+
+        Raises:
+            RuntimeError: If no consistent read succeeded within JOURNAL_READ_ATTEMPTS.
+        """
+        for attempt in range(1, self.JOURNAL_READ_ATTEMPTS + 1):
+            folded = self.load(self._folded_file(relative_path), {"base": None, "segments": []})
+            before = self.version(relative_path)
+            skip = set(folded["segments"]) if before != folded["base"] else set()
+            segments = [s for s in self._list_journal(relative_path) if s not in skip]
+            if segments:
+                base = self.load(relative_path, [], columns=columns, **load_args)
+            else:
+                base = self.load(relative_path, initial_value, columns=columns, **load_args)
+            texts, errors = self.read_many(segments, binary=False)
+            for error in errors.values():
+                if not isinstance(error, FileNotFoundError):
+                    raise error
+            stable = (not errors and self.version(relative_path) == before
+                      and self.load(self._folded_file(relative_path), {"base": None, "segments": []}) == folded)
+            if stable:
+                break
+            time.sleep(self.JOURNAL_RETRY_DELAY * attempt)
+        else:
+            raise RuntimeError(f"Journal of {relative_path} changed during {self.JOURNAL_READ_ATTEMPTS} read attempts")
+
+        if not segments:
+            return base, []
+        base = base if isinstance(base, pd.DataFrame) else pd.DataFrame(base)
+        records = pd.DataFrame([json.loads(texts[s]) for s in segments])
+        if columns is not None:
+            records = records[[col for col in records.columns if col in columns]]
+        return pd.concat([base, records], ignore_index=True), segments
+
+    def load_journal(self, relative_path, initial_value=None, columns=None, **load_args):
+        """
+        Load a journaled table file and fold all pending journal segments into it.
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+            initial_value: The value to return if neither the file nor any segment exists.
+            columns: Optional list of columns to load (see load).
+            **load_args: Additional arguments to pass to the file loader.
+
+        Returns:
+            The base table with all journal records appended, as a DataFrame, or the
+            initial value if there is nothing stored yet.
+        """
+        return self.read_journal(relative_path, initial_value, columns=columns, **load_args)[0]
+
+    def compact_journal(self, relative_path, content=None, schema=None, segments=None):
+        """
+        Fold the journal segments of a file into its base file and remove them.
+
+        The base file is written before the segments are deleted, so an interrupted
+        compaction never loses records. Only segments whose records are in the new
+        base are deleted; segments appended meanwhile stay in the journal. Before the
+        base is written, the folded segments are recorded for read_journal. All
+        compactions of a file run under its journal_lock.
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+            content: The complete table to write as new base, already in storage form.
+                If None, the base file and the segments are folded from storage.
+            schema: Optional TableSchema used to convert a folded table into its storage form.
+            segments: The segments whose records `content` contains, e.g. as returned by
+                read_journal when the table was read. Required if content is given.
+
+        Raises:
+            ValueError: If content is given without segments.
+        """
+        if content is not None and segments is None:
+            raise ValueError("compact_journal: segments are required when content is given")
+
+        with self.journal_lock(relative_path):
+            if content is None:
+                ext = posixpath.splitext(relative_path)[-1].lower()
+                load_args = schema.read_args() if schema is not None and ext == ".csv" else {}
+                content, segments = self.read_journal(relative_path, [], **load_args)
+                if not segments:
+                    return
+                if schema is not None:
+                    content = schema.serialize(schema.apply(content), native=ext == ".parquet")
+
+            # Readers skip these segments as soon as the base differs from the recorded version
+            self.save(self._folded_file(relative_path),
+                      {"base": self.version(relative_path), "segments": list(segments)})
+            self.save(relative_path, content)
+            for segment in segments:
+                try:
+                    self.filesystem.rm(self._resolve_path(segment))
+                except FileNotFoundError:  # already removed by a compaction of another process
+                    pass
+
+    def compact_journal_async(self, relative_path, schema=None):
+        """
+        Start compact_journal in a background thread unless one is already running for the file.
+
+        Args:
+            relative_path: The path of the journaled file relative to the root directory.
+            schema: Optional TableSchema (see compact_journal).
+        """
+        key = self._resolve_path(relative_path)
+        with DataHandler._compaction_lock:
+            if key in DataHandler._compactions_running:
+                return
+            DataHandler._compactions_running.add(key)
+
+        def run():
+            try:
+                self.compact_journal(relative_path, schema=schema)
+            finally:
+                with DataHandler._compaction_lock:
+                    DataHandler._compactions_running.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
@@ -1,7 +1,14 @@
-import fsspec, posixpath
+import posixpath
+import yaml
+from datetime import datetime
 import streamlit as st
 import pandas as pd
+from utils import disk_cache, export_cache, fs_registry, metrics, text_extraction
 from utils.data_handler import DataHandler
+from utils.blob_store import BlobStore
+from utils.export_jobs import PendingExports
+from utils.search_index import SearchIndex
+from utils.date_index import DateIndex
 
 class DataManager:
     """
@@ -31,6 +38,11 @@ class DataManager:
         - Implements data registry for tracking stored files
     """
 
+    ATTACHMENT_INDEX_FILE = "anhang_text.search.parquet"
+    ATLAS_INDEX_FILE = "zellatlas.search.parquet"
+    SEARCH_INDEX_SUFFIX = ".search.v2.parquet"  # change when the indexed fields change, the index is then rebuilt
+    SEARCH_EXCLUDED_COLUMNS = ["bilder"]  # sha256 digests of images, their hex digits would match prefix queries
+
     def __new__(cls, *args, **kwargs):
         """
         Implements singleton pattern by returning existing instance from session state if available.
@@ -45,20 +57,40 @@ class DataManager:
             st.session_state.data_manager = instance
             return instance
     
-    def __init__(self, fs_protocol = 'file', fs_root_folder = 'app_data'):
+    def __init__(self, fs_protocol = 'file', fs_root_folder = 'app_data', read_cache_folder = None,
+                 read_cache_max_bytes = disk_cache.DEFAULT_MAX_BYTES, metrics_file = None):
         """
         Initialize the data manager with filesystem configuration.
         Sets up the filesystem interface and initializes data registries for the application.
         If the instance is already initialized (has 'fs' attribute), the initialization is skipped.
             fs_protocol (str, optional): Protocol to use for filesystem operations.
-                Can be 'file' or 'webdav'. Defaults to 'file'.
+                Can be 'file' or 'webdav', or an fsspec filesystem instance. Defaults to 'file'.
             fs_root_folder (str, optional): Base directory path for all file operations.
                 Defaults to 'app_data'.
+            read_cache_folder (str, optional): Local folder for the read-through disk cache of
+                binary files. Defaults to None (no cache).
+            read_cache_max_bytes (int, optional): Size cap of the read cache in bytes.
+            metrics_file (str, optional): Local file the storage metrics are exported to periodically
+                (.json for JSON, otherwise Prometheus text format). Defaults to None (no export).
         Attributes:
             fs_root_folder (str): Base directory path for file operations
             fs: Filesystem interface instance
+            read_cache: Shared DiskCache for read_binary, or None
             app_data_reg (dict): Registry for application-wide data
             user_data_reg (dict): Registry for user-specific data
+            journal_reg (set): Session state keys whose files are stored as append-only journals
+            segments_reg (dict): Journal segments whose records the session state data of a key contains
+            schema_reg (dict): Table schemas of typed session state keys
+            projected_reg (set): Session state keys holding only a subset of the stored columns
+            migrated_reg (set): (username, file name) pairs already checked by migrate_user_data
+            version_reg (dict): Remote version each revalidated session state key was loaded at
+            revision_reg (dict): Change counter per session state key, see revision()
+            search_reg (set): Session state keys whose records are kept in a full-text index
+            search_indexes (dict): Loaded search indexes per session state key
+            attachment_indexes (dict): Loaded attachment text indexes per user name
+            atlas_indexes (dict): Loaded Zellatlas search indexes per user name
+            date_indexes (dict): Date indexes per session state key, see get_date_index()
+            blob_stores (dict): Blob stores per user name, created on first access
         """
         if hasattr(self, 'fs'):  # check if instance is already initialized
             return
@@ -66,18 +98,37 @@ class DataManager:
         # initialize filesystem stuff
         self.fs_root_folder = fs_root_folder
         self.fs = self._init_filesystem(fs_protocol)
+        self.read_cache = disk_cache.get_cache(read_cache_folder, read_cache_max_bytes) if read_cache_folder else None
+        if metrics_file:
+            metrics.start_export(metrics_file)
         self.app_data_reg = {}
         self.user_data_reg = {}
+        self.journal_reg = set()
+        self.segments_reg = {}
+        self.schema_reg = {}
+        self.projected_reg = set()
+        self.migrated_reg = set()
+        self.version_reg = {}
+        self.revision_reg = {}
+        self.search_reg = set()
+        self.search_indexes = {}
+        self.attachment_indexes = {}
+        self.atlas_indexes = {}
+        self.date_indexes = {}
+        self.blob_stores = {}
 
     @staticmethod
     def _init_filesystem(protocol: str):
         """
-        Creates and configures an fsspec filesystem instance.
+        Returns the configured fsspec filesystem instance for the protocol.
 
         Supports WebDAV protocol using credentials from Streamlit secrets, and local filesystem access.
+        The instance comes from the process-wide registry in utils.fs_registry, so all sessions
+        share one connection pool while the DataManager itself stays per session.
         
         Args:
-            protocol: The filesystem protocol to initialize ('webdav' or 'file')
+            protocol: The filesystem protocol to initialize ('webdav' or 'file'), or an
+                existing fsspec filesystem instance that is used as is
             
         Returns:
             fsspec.AbstractFileSystem: Configured filesystem instance
@@ -85,13 +136,16 @@ class DataManager:
         Raises:
             ValueError: If an unsupported protocol is specified
         """
-        if protocol == 'webdav':
+        if not isinstance(protocol, str):  # ready-made filesystem object, e.g. in benchmarks
+            return protocol
+        elif protocol == 'webdav':
             secrets = st.secrets['webdav']
-            return fsspec.filesystem('webdav', 
-                                     base_url=secrets['base_url'], 
-                                     auth=(secrets['username'], secrets['password']))
+            return fs_registry.get_filesystem('webdav',
+                                              base_url=secrets['base_url'],
+                                              username=secrets['username'],
+                                              password=secrets['password'])
         elif protocol == 'file':
-            return fsspec.filesystem('file')
+            return fs_registry.get_filesystem('file')
         else:
             raise ValueError(f"AppManager: Invalid filesystem protocol: {protocol}")
 
@@ -106,9 +160,64 @@ class DataManager:
             DataHandler: Configured for operations in the specified folder
         """
         if subfolder is None:
-            return DataHandler(self.fs, self.fs_root_folder)
+            return DataHandler(self.fs, self.fs_root_folder, cache=self.read_cache)
         else:
-            return DataHandler(self.fs, posixpath.join(self.fs_root_folder, subfolder))
+            return DataHandler(self.fs, posixpath.join(self.fs_root_folder, subfolder), cache=self.read_cache)
+
+    def get_blob_store(self):
+        """
+        Returns the content-addressed blob store of the logged in user.
+
+        The store is created once per session and user. Its hash index is merged with the
+        stored one on every write and can be reloaded with BlobStore.refresh().
+
+        Returns:
+            BlobStore: Blob store backed by the shared `blobs` folder and the user's hash index
+
+        Raises:
+            ValueError: If no user is currently logged in
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            raise ValueError("DataManager: No user logged in, cannot access the blob store")
+
+        if username not in self.blob_stores:
+            self.blob_stores[username] = BlobStore(self._get_data_handler('blobs'),
+                                                   self._get_data_handler('user_data_' + username))
+        return self.blob_stores[username]
+
+    def get_export_cache(self):
+        """
+        Returns the cache of rendered Word/PDF exports of the logged in user, shared by all
+        sessions of the process.
+
+        Returns:
+            ExportCache: Cache backed by the user's `export_cache` folder
+
+        Raises:
+            ValueError: If no user is currently logged in
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            raise ValueError("DataManager: No user logged in, cannot access the export cache")
+
+        return export_cache.get_export_cache(self._get_data_handler(f"export_cache/{username}"))
+
+    def get_pending_exports(self):
+        """
+        Returns the documents of the logged in user that are planned but not stored yet.
+
+        Returns:
+            PendingExports: Pending export names in the user's data folder
+
+        Raises:
+            ValueError: If no user is currently logged in
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            raise ValueError("DataManager: No user logged in, cannot access the pending exports")
+
+        return PendingExports(self._get_data_handler('user_data_' + username))
 
     def load_app_data(self, session_state_key, file_name, initial_value=None, **load_args):
         """
@@ -134,7 +243,9 @@ class DataManager:
         st.session_state[session_state_key] = data
         self.app_data_reg[session_state_key] = file_name
 
-    def load_user_data(self, session_state_key, file_name, initial_value=None, **load_args):
+    @metrics.timed("load_user_data", folder=lambda self, session_state_key, *args, **kwargs: session_state_key)
+    def load_user_data(self, session_state_key, file_name, initial_value=None, journal=False, schema=None,
+                       columns=None, revalidate=False, search=False, **load_args):
         """
         Load user-specific data from a file in the user's data folder.
 
@@ -142,6 +253,17 @@ class DataManager:
             session_state_key (str): Key under which the data will be stored in Streamlit's session state
             file_name (str): Name of the file to load data from
             initial_value: Default value to return if file doesn't exist (default: None)
+            journal (bool): Store the file as an append-only journal. Records added with
+                append_record are then written as small segments instead of rewriting the file.
+            schema (TableSchema): Optional table schema. The data is then stored in session state as a
+                typed DataFrame and converted back to its storage form on save.
+            columns (list): Optional column projection for table files. Projected data is read-only:
+                save_data refuses to write it back, use append_record or delete_records instead.
+            revalidate (bool): If the data is already in session state, compare the remote version
+                (ETag or mtime/size, plus journal segments) with the version it was loaded at and
+                reload only if it changed. Without revalidate, data in session state is never reloaded.
+            search (bool): Keep the records in a full-text index next to the file (requires a schema,
+                see get_search_index). Records added with append_record are indexed on save.
             **load_args: Additional arguments to pass to the data handler's load method
 
         Returns:
@@ -162,20 +284,280 @@ class DataManager:
             self.user_data_reg = {}
             st.error(f"DataManager: No user logged in, cannot load file `{file_name}` into session state with key `{session_state_key}`")
             return
-        elif session_state_key in st.session_state:
-            return
 
         user_data_folder = 'user_data_' + username
-
         dh = self._get_data_handler(user_data_folder)
-        data = dh.load(file_name, initial_value, **load_args)
+
+        version = None
+        if session_state_key in st.session_state:
+            if not revalidate:
+                return
+            version = dh.version(file_name, journal)
+            cached = self.version_reg.get(session_state_key)
+            if cached is not None and cached == (dh.join(user_data_folder, file_name), columns, version):
+                return
+        elif revalidate:
+            version = dh.version(file_name, journal)
+
+        data, segments = self._read_table(dh, file_name, initial_value, journal, schema, columns, **load_args)
+        if revalidate:
+            self.version_reg[session_state_key] = (dh.join(user_data_folder, file_name), columns, version)
+        if schema is not None:
+            self.schema_reg[session_state_key] = schema
+        if search:
+            self.search_reg.add(session_state_key)
+        if journal:
+            self.journal_reg.add(session_state_key)
+            self.segments_reg[session_state_key] = segments
+        if columns is not None:
+            self.projected_reg.add(session_state_key)
+        else:
+            self.projected_reg.discard(session_state_key)
         st.session_state[session_state_key] = data
+        self._bump_revision(session_state_key)
         self.user_data_reg[session_state_key] = dh.join(user_data_folder, file_name)
 
+    def revision(self, session_state_key):
+        """
+        Returns a counter that changes whenever the DataManager replaces the value of a session state key.
+
+        Pages can use it to cache values derived from the data (e.g. display rows) and rebuild
+        them only when the data was reloaded, appended to or had records deleted.
+
+        Args:
+            session_state_key (str): Key identifying the data in session state
+
+        Returns:
+            int: Revision of the data, 0 if it was never loaded
+        """
+        return self.revision_reg.get(session_state_key, 0)
+
+    def get_search_index(self, session_state_key):
+        """
+        Returns the full-text index of a table loaded with `search=True`.
+
+        The index is stored as `<file>.search.v2.parquet` next to the table and covers all schema
+        columns except SEARCH_EXCLUDED_COLUMNS. It is built from the complete table the first time
+        it is needed and afterwards only read, and it is read again whenever the data was reloaded
+        (see revision), e.g. after another session added records.
+
+            >>> index = data_manager.get_search_index("chemie_eintraege")
+            >>> index.search("titra 2025")
+            {'20250508_titration.docx'}
+
+        Args:
+            session_state_key (str): Key identifying the table in session state
+
+        Returns:
+            SearchIndex: The index, with record ids taken from the 'dateiname' column
+
+        Raises:
+            ValueError: If the key was not loaded with a schema and search=True
+        """
+        if session_state_key not in self.search_reg or session_state_key not in self.schema_reg:
+            raise ValueError(f"DataManager: No search index registered for session state key {session_state_key}")
+
+        revision = self.revision(session_state_key)
+        index = self.search_indexes.get(session_state_key)
+        if index is not None and index.revision == revision:
+            return index
+
+        dh = self._get_data_handler()
+        file_name = self.data_reg[session_state_key]
+        schema = self.schema_reg[session_state_key]
+        fields = [col for col in schema.columns if col not in self.SEARCH_EXCLUDED_COLUMNS]
+        index = SearchIndex(dh, posixpath.splitext(file_name)[0] + self.SEARCH_INDEX_SUFFIX, fields=fields)
+        if index.exists():
+            index.load()
+        else:
+            index.build(self._read_table(dh, file_name, [], session_state_key in self.journal_reg, schema)[0])
+        index.revision = revision
+        self.search_indexes[session_state_key] = index
+        return index
+
+    def get_date_index(self, session_state_key):
+        """
+        Returns the date index (sorted 'datum' column and semester/month facet counts) of a table in session state.
+
+        The index is built from the session state data, so it costs no storage access. It is
+        updated record by record by append_record and delete_records and built again only
+        when the data was reloaded (see revision).
+
+        Args:
+            session_state_key (str): Key identifying the table in session state
+
+        Returns:
+            DateIndex: Index with record ids taken from the 'dateiname' column
+        """
+        revision = self.revision(session_state_key)
+        index = self.date_indexes.get(session_state_key)
+        if index is None or index.revision != revision:
+            index = DateIndex.from_frame(pd.DataFrame(st.session_state[session_state_key]))
+            index.revision = revision
+            self.date_indexes[session_state_key] = index
+        return index
+
+    def _attachment_index(self, username):
+        return SearchIndex(self._get_data_handler('user_data_' + username), self.ATTACHMENT_INDEX_FILE,
+                           fields=["name", "text"], id_column="name")
+
+    def index_attachments(self, files):
+        """
+        Extracts the text of uploaded PDF and Word attachments in a background worker pool
+        and adds it to the attachment index of the logged in user.
+
+        The call returns immediately; other file types are ignored.
+
+        Args:
+            files (list): (file name, content) tuples, with the names the files are stored under
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            raise ValueError("DataManager: No user logged in, cannot index attachments")
+        text_extraction.index_async(self._attachment_index(username), files)
+
+    def get_attachment_index(self):
+        """
+        Returns the attachment text index of the logged in user, see index_attachments.
+
+        The index is read again when its stored version changed, e.g. after a background
+        extraction finished.
+
+        Returns:
+            SearchIndex: Index with the attachment file names as ids
+
+        Raises:
+            ValueError: If no user is currently logged in
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            raise ValueError("DataManager: No user logged in, cannot access the attachment index")
+
+        return self._user_index(self.attachment_indexes, username, self._attachment_index)
+
+    def _user_index(self, indexes, username, create, build=None):
+        """
+        Returns the cached per-user index, read again if its stored version changed.
+        A `build` function is called instead if the index was never stored.
+        """
+        index = indexes.get(username)
+        if index is None:
+            index = indexes[username] = create(username)
+        version = index.data_handler.version(index.file_name, journal=True)
+        if index.revision != version:
+            if build is not None and version == (None, ()):
+                build(index)
+                version = index.data_handler.version(index.file_name, journal=True)
+            else:
+                index.load()
+            index.revision = version
+        return index
+
+    def _atlas_handler(self, username):
+        return self._get_data_handler(f"zellatlas_haematologie/{username}")
+
+    def _atlas_index(self, username):
+        return SearchIndex(self._atlas_handler(username), self.ATLAS_INDEX_FILE,
+                           fields=["typ", "beschreibung", "zeit"], id_column="datei")
+
+    @staticmethod
+    def _atlas_record(file_name, data):
+        zeit = data.get("zeit", "")
+        try:
+            zeit = datetime.fromisoformat(zeit)
+        except (TypeError, ValueError):
+            pass
+        return {"datei": file_name, "typ": data.get("typ", ""), "beschreibung": data.get("beschreibung", ""),
+                "zeit": zeit}
+
+    def _build_atlas_index(self, index):
+        dh = index.data_handler
+        namen = [name for name in dh.list_existing() if name.endswith(".yaml") and "/" not in name]
+        texte, _ = dh.read_many(namen, binary=False)
+        records = []
+        for name, text in texte.items():
+            try:
+                data = yaml.safe_load(text)
+            except yaml.YAMLError:
+                continue
+            if isinstance(data, dict):
+                records.append(self._atlas_record(name, data))
+        index.build(records)
+
+    def get_atlas_index(self):
+        """
+        Returns the search index over the Zellatlas entries (YAML files) of the logged in user.
+
+        The index is stored in the user's Zellatlas folder. It is built from the YAML files the
+        first time it is needed and kept up to date by index_atlas_entry and remove_atlas_entries.
+
+        Returns:
+            SearchIndex: Index with the YAML file names as ids
+
+        Raises:
+            ValueError: If no user is currently logged in
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            raise ValueError("DataManager: No user logged in, cannot access the Zellatlas index")
+        return self._user_index(self.atlas_indexes, username, self._atlas_index, self._build_atlas_index)
+
+    def index_atlas_entry(self, file_name, data):
+        """
+        Adds a saved Zellatlas entry to the atlas search index.
+
+        Args:
+            file_name (str): Name of the entry's YAML file
+            data (dict): The entry as written to the file (typ, beschreibung, zeit)
+        """
+        self.get_atlas_index().add(self._atlas_record(file_name, data))
+
+    def remove_atlas_entries(self, file_names):
+        """
+        Removes deleted Zellatlas entries from the atlas search index.
+
+        Args:
+            file_names (list): Names of the deleted YAML files
+        """
+        self.get_atlas_index().remove(file_names)
+
+    def _bump_revision(self, session_state_key):
+        self.revision_reg[session_state_key] = self.revision_reg.get(session_state_key, 0) + 1
+
+    @staticmethod
+    def _read_table(dh, file_name, initial_value=None, journal=False, schema=None, columns=None, **load_args):
+        """
+        Reads a (journaled) file through a data handler and applies the schema, if any.
+
+        Returns:
+            A tuple (data, segments) with the journal segments folded into the data.
+        """
+        if schema is not None and file_name.lower().endswith(".csv"):
+            load_args = {**schema.read_args(), **load_args}
+        segments = []
+        if journal:
+            data, segments = dh.read_journal(file_name, initial_value, columns=columns, **load_args)
+        else:
+            data = dh.load(file_name, initial_value, columns=columns, **load_args)
+        if schema is not None:
+            data = schema.apply(data, columns=columns)
+        return data, segments
+
+    def _storage_form(self, session_state_key, content):
+        """
+        Converts typed session state data into the form it is written to storage in.
+        """
+        schema = self.schema_reg.get(session_state_key)
+        if schema is None:
+            return content
+        native = self.data_reg[session_state_key].lower().endswith(".parquet")
+        return schema.serialize(content, native=native)
+
     @property
     def data_reg(self):
         return {**self.app_data_reg, **self.user_data_reg}
 
+    @metrics.timed("save_data", folder=lambda self, session_state_key, *args, **kwargs: session_state_key)
     def save_data(self, session_state_key):
         """
         Saves data from session state to persistent storage using the registered data handler.
@@ -186,6 +568,7 @@ class DataManager:
         Raises:
             ValueError: If the session_state_key is not registered in data_reg
             ValueError: If the session_state_key is not found in session state
+            ValueError: If the data was loaded with a column projection
 
         Example:
             >>> data_manager.save_data("user_settings")
@@ -195,9 +578,20 @@ class DataManager:
         
         if session_state_key not in st.session_state:
             raise ValueError(f"DataManager: Key {session_state_key} not found in session state")
+
+        if session_state_key in self.projected_reg:
+            raise ValueError(f"DataManager: Key {session_state_key} holds a column projection and cannot be saved")
         
         dh = self._get_data_handler()
-        dh.save(self.data_reg[session_state_key], st.session_state[session_state_key])
+        content = self._storage_form(session_state_key, st.session_state[session_state_key])
+        self.version_reg.pop(session_state_key, None)  # own writes invalidate the cached version
+        if session_state_key in self.journal_reg:
+            # Records other sessions appended meanwhile stay in the journal
+            dh.compact_journal(self.data_reg[session_state_key], content,
+                               segments=self.segments_reg.get(session_state_key, []))
+            self.segments_reg[session_state_key] = []
+        else:
+            dh.save(self.data_reg[session_state_key], content)
 
     def save_all_data(self):
         """
@@ -211,6 +605,7 @@ class DataManager:
     def append_record(self,session_state_key, record_dict):
         """
         Append a new record to a value stored in the session state. The value must be either a list or a DataFrame.
+        For journaled keys only the new record is written to storage.
 
         Args:
             session_state_key (str): Key identifying the value in the session state
@@ -229,17 +624,111 @@ class DataManager:
         
         if not isinstance(record_dict, dict):
             raise ValueError(f"DataManager: The record_dict must be a dictionary")
+
+        # the index is loaded (or built) before the record is stored, so it is added exactly once
+        index = self.get_search_index(session_state_key) if session_state_key in self.search_reg else None
+        typed_record = record_dict
         
         if isinstance(data_value, pd.DataFrame):
-            data_value = pd.concat([data_value, pd.DataFrame([record_dict])], ignore_index=True)
+            new_row = pd.DataFrame([record_dict])
+            if session_state_key in self.schema_reg:
+                new_row = self.schema_reg[session_state_key].apply(new_row)
+                typed_record = new_row.to_dict("records")[0]
+            data_value = pd.concat([data_value, new_row], ignore_index=True)
         elif isinstance(data_value, list):
             data_value.append(record_dict)
         else:
             raise ValueError(f"DataManager: The session state value for key {session_state_key} must be a DataFrame or a list")
         
         st.session_state[session_state_key] = data_value
-        self.save_data(session_state_key)
+        self._bump_revision(session_state_key)
+        if session_state_key in self.journal_reg:
+            self.version_reg.pop(session_state_key, None)
+            dh = self._get_data_handler()
+            segment = dh.append_journal(self.data_reg[session_state_key], record_dict,
+                                        self.schema_reg.get(session_state_key))
+            self.segments_reg.setdefault(session_state_key, []).append(segment)
+        else:
+            self.save_data(session_state_key)
+        if index is not None:
+            index.add(typed_record)
+            index.revision = self.revision(session_state_key)
+        date_index = self.date_indexes.get(session_state_key)
+        if date_index is not None and date_index.revision == self.revision(session_state_key) - 1:
+            date_index.add(typed_record)
+            date_index.revision = self.revision(session_state_key)
+
+    def delete_records(self, session_state_key, column, values):
+        """
+        Delete all records whose value in `column` is one of `values`, both in storage and in the session state.
+
+        The complete table is read from storage for this, so the method also works for data that
+        was loaded with a column projection.
+
+        Args:
+            session_state_key (str): Key identifying the table in the session state
+            column (str): Column identifying the records, e.g. 'dateiname'
+            values: Values of the records to delete
+
+        Raises:
+            ValueError: If the session_state_key is not registered in data_reg
+        """
+        if session_state_key not in self.data_reg:
+            raise ValueError(f"DataManager: No data registered for session state key {session_state_key}")
 
+        values = set(values)
+        dh = self._get_data_handler()
+        file_name = self.data_reg[session_state_key]
+        journal = session_state_key in self.journal_reg
+        # No other compaction may write the file between reading and writing it back
+        with dh.journal_lock(file_name):
+            data, segments = self._read_table(dh, file_name, [], journal, self.schema_reg.get(session_state_key))
+            data = pd.DataFrame(data)
+            if column in data.columns:
+                data = data[~data[column].isin(values)].reset_index(drop=True)
+
+            content = self._storage_form(session_state_key, data)
+            self.version_reg.pop(session_state_key, None)
+            if journal:
+                dh.compact_journal(file_name, content, segments=segments)
+                self.segments_reg[session_state_key] = [s for s in self.segments_reg.get(session_state_key, [])
+                                                        if s not in segments]
+            else:
+                dh.save(file_name, content)
+
+        session_data = st.session_state.get(session_state_key)
+        if isinstance(session_data, pd.DataFrame) and column in session_data.columns:
+            st.session_state[session_state_key] = session_data[~session_data[column].isin(values)].reset_index(drop=True)
+            self._bump_revision(session_state_key)
+
+        for index in (self.search_indexes.get(session_state_key), self.date_indexes.get(session_state_key)):
+            if index is not None and column == index.id_column:
+                index.remove(values)
+                index.revision = self.revision(session_state_key)
+
+    def migrate_user_data(self, source_file_name, target_file_name, journal=False, schema=None):
+        """
+        One-shot migration of a user file into another format, e.g. from .csv to .parquet.
 
+        Does nothing if the target already exists or the source does not. Pending journal
+        segments of the source are folded in; the source file itself is kept as backup.
 
+        Args:
+            source_file_name (str): Name of the existing file in the user's data folder
+            target_file_name (str): Name of the new file in the user's data folder
+            journal (bool): The source file is journaled
+            schema (TableSchema): Optional schema applied during the conversion
+        """
+        username = st.session_state.get('username', None)
+        if username is None or (username, target_file_name) in self.migrated_reg:
+            return
 
+        dh = self._get_data_handler('user_data_' + username)
+        if not dh.exists(target_file_name):
+            source_segments = dh._list_journal(source_file_name) if journal else []
+            if dh.exists(source_file_name) or source_segments:
+                data = pd.DataFrame(self._read_table(dh, source_file_name, [], journal, schema)[0])
+                if schema is not None:
+                    data = schema.serialize(data, native=target_file_name.lower().endswith(".parquet"))
+                dh.save(target_file_name, data)
+        self.migrated_reg.add((username, target_file_name))
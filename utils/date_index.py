@@ -0,0 +1,140 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+import pandas as pd
+
+
+class DateIndex:
+    """
+    Sorted index over the date column of a table, with facet counts.
+
+    Record ids are kept ordered by date, so a date range is two bisections and a
+    slice instead of a boolean mask over the whole table. The number of records per
+    semester and per month is counted once when the index is built and then updated
+    record by record.
+
+        >>> index = DateIndex.from_frame(df)
+        >>> index.between(date(2025, 5, 1), date(2025, 5, 31))
+        ['20250502_titration.docx', '20250508_puffer.docx']
+        >>> index.facets["monat"]
+        Counter({'2025-05': 2, '2025-04': 7})
+    """
+
+    def __init__(self, date_column="datum", id_column="dateiname", semester_column="semester"):
+        """
+        Initialize an empty index.
+
+        Args:
+            date_column: Column holding the record date.
+            id_column: Column identifying a record.
+            semester_column: Column counted in the "semester" facet.
+        """
+        self.date_column = date_column
+        self.id_column = id_column
+        self.semester_column = semester_column
+        self.dates = []
+        self.ids = []
+        self.records = {}
+        self.facets = {"semester": Counter(), "monat": Counter()}
+        self.revision = None
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        """
+        Build the index from a DataFrame.
+
+        Args:
+            df: Table with the id, date and semester columns.
+            **kwargs: Column names, see __init__.
+
+        Returns:
+            DateIndex: The new index.
+        """
+        index = cls(**kwargs)
+        if index.id_column not in df.columns:
+            return index
+        columns = [index.id_column, index.date_column, index.semester_column]
+        rows = df.reindex(columns=columns)
+        for doc_id, datum, semester in zip(rows[index.id_column], rows[index.date_column], rows[index.semester_column]):
+            index._register(doc_id, datum, semester)
+        order = sorted(range(len(index.dates)), key=index.dates.__getitem__)
+        index.dates = [index.dates[i] for i in order]
+        index.ids = [index.ids[i] for i in order]
+        return index
+
+    @staticmethod
+    def _to_date(value):
+        if value is None or pd.isna(value):
+            return None
+        return pd.Timestamp(value).date()
+
+    def _register(self, doc_id, datum, semester):
+        # Facets and lookup table; the caller places the date in the sorted lists
+        if not doc_id or doc_id in self.records:
+            return
+        datum = self._to_date(datum)
+        semester = "" if semester is None or pd.isna(semester) else str(semester)
+        self.records[doc_id] = (datum, semester)
+        self.facets["semester"][semester] += 1
+        if datum is not None:
+            self.facets["monat"][datum.strftime("%Y-%m")] += 1
+            self.dates.append(datum)
+            self.ids.append(doc_id)
+
+    def add(self, record):
+        """
+        Add a record (dict) to the index, keeping the dates sorted.
+        """
+        doc_id = record.get(self.id_column)
+        if not doc_id or doc_id in self.records:
+            return
+        datum = self._to_date(record.get(self.date_column))
+        semester = record.get(self.semester_column)
+        if datum is None:
+            self._register(doc_id, None, semester)
+            return
+        position = bisect_right(self.dates, datum)
+        self._register(doc_id, datum, semester)
+        # _register appended at the end, move the new record to its sorted position
+        self.dates.insert(position, self.dates.pop())
+        self.ids.insert(position, self.ids.pop())
+
+    def remove(self, doc_ids):
+        """
+        Remove records from the index.
+
+        Args:
+            doc_ids: Ids of the records to remove.
+        """
+        for doc_id in doc_ids:
+            if doc_id not in self.records:
+                continue
+            datum, semester = self.records.pop(doc_id)
+            self.facets["semester"][semester] -= 1
+            if not self.facets["semester"][semester]:
+                del self.facets["semester"][semester]
+            if datum is None:
+                continue
+            monat = datum.strftime("%Y-%m")
+            self.facets["monat"][monat] -= 1
+            if not self.facets["monat"][monat]:
+                del self.facets["monat"][monat]
+            lo, hi = bisect_left(self.dates, datum), bisect_right(self.dates, datum)
+            position = lo + self.ids[lo:hi].index(doc_id)
+            del self.dates[position]
+            del self.ids[position]
+
+    def between(self, start=None, end=None):
+        """
+        Return the ids of all records dated from `start` to `end` (both inclusive), oldest first.
+
+        Args:
+            start: First date (datetime.date) or None for no lower bound.
+            end: Last date (datetime.date) or None for no upper bound.
+
+        Returns:
+            A list of record ids.
+        """
+        lo = 0 if start is None else bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect_right(self.dates, end)
+        return self.ids[lo:hi]
@@ -0,0 +1,132 @@
+import hashlib, os, threading
+from collections import OrderedDict
+
+# Default size cap for the local read cache
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _digest(value):
+    return hashlib.sha256(str(value).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Bounded local LRU cache for remote file contents.
+
+    Entries are keyed by remote path and version (ETag or mtime/size), so a
+    changed remote file is never served from the cache. Files live in
+    `cache_dir` as `<sha(path)>.<sha(version)>`; the least recently used
+    files are deleted once the total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initialize the cache and pick up entries left from earlier runs.
+
+        Args:
+            cache_dir: Local directory for the cached files.
+            max_bytes: Size cap in bytes for all cached files together.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key digest -> (version digest, size)
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for name in os.listdir(cache_dir):
+            key_digest, _, version_digest = name.partition(".")
+            if not version_digest or version_digest.endswith(".tmp"):
+                continue
+            stat = os.stat(os.path.join(cache_dir, name))
+            existing.append((stat.st_mtime, key_digest, version_digest, stat.st_size))
+        for _, key_digest, version_digest, size in sorted(existing):
+            self._entries[key_digest] = (version_digest, size)
+            self._total_bytes += size
+
+    def _path(self, key_digest, version_digest):
+        return os.path.join(self.cache_dir, f"{key_digest}.{version_digest}")
+
+    def get(self, key, version=None):
+        """
+        Return the cached content for a key.
+
+        Args:
+            key: The remote path.
+            version: The remote version. If None, any cached version is accepted
+                (only use this for immutable files).
+
+        Returns:
+            The cached bytes, or None on a miss.
+        """
+        key_digest = _digest(key)
+        with self._lock:
+            entry = self._entries.get(key_digest)
+            if entry is None or (version is not None and entry[0] != _digest(version)):
+                return None
+            self._entries.move_to_end(key_digest)
+            path = self._path(key_digest, entry[0])
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                if self._entries.get(key_digest) == entry:
+                    del self._entries[key_digest]
+                    self._total_bytes -= entry[1]
+            return None
+
+    def put(self, key, version, data):
+        """
+        Store content for a key, replacing older versions and evicting least recently used entries.
+
+        Args:
+            key: The remote path.
+            version: The remote version of the content.
+            data: The content as bytes.
+        """
+        if len(data) > self.max_bytes:
+            return
+        key_digest, version_digest = _digest(key), _digest(version)
+        path = self._path(key_digest, version_digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._entries.pop(key_digest, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+                if old[0] != version_digest:
+                    self._remove(key_digest, old[0])
+            self._entries[key_digest] = (version_digest, len(data))
+            self._total_bytes += len(data)
+
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, (old_version, old_size) = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self._remove(old_key, old_version)
+
+    def _remove(self, key_digest, version_digest):
+        try:
+            os.remove(self._path(key_digest, version_digest))
+        except FileNotFoundError:
+            pass
+
+
+def get_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Return the process-wide DiskCache for a directory, creating it on first use.
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = DiskCache(cache_dir, max_bytes)
+        return _caches[cache_dir]
@@ -0,0 +1,304 @@
+"""
+Document model shared by all Word/PDF exports.
+
+A report is a title plus a list of sections. Each section holds blocks: text,
+key/value fields, tables and images. The subject builders (see export_renderers)
+only describe the content once; render_docx and render_pdf lay it out with
+python-docx and reportlab platypus. Images are decoded, downsized and JPEG-encoded
+once per export (ImageCache) and the same encoding is embedded by both renderers.
+Both renderers can also append the sections of a report to an existing document.
+
+    >>> report = Report("Praktikum: Titration", subtitle="Datum: 08.05.2025")
+    >>> report.section("Ziel").text("pH-Wert bestimmen")
+    >>> report.section("Bilder", page_break=True).images(images.prepare(payload["bilder"]))
+    >>> word_bytes, pdf_bytes = render_docx(report), render_pdf(report)
+    >>> word_bytes = render_docx(nachtrag, base=word_bytes)
+"""
+import functools
+import hashlib
+import io
+from xml.sax.saxutils import escape
+
+import docx
+from docx.shared import Inches
+from PIL import Image
+from pypdf import PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+from reportlab.platypus import Table as PdfTable
+
+
+RENDERER_VERSION = 2  # bump on every layout change, cached exports of older versions are not used
+DOCX_TEMPLATE = None  # path of a .docx whose styles the exports use, None for the python-docx default
+MAX_IMAGE_PIXELS = 1600  # longest side of embedded images, enough for a full-width print
+JPEG_QUALITY = 88
+WORD_IMAGE_WIDTH = Inches(4.5)
+PDF_IMAGE_SIZE = (12 * cm, 8 * cm)  # maximum width and height, the aspect ratio is kept
+
+
+class Text:
+    def __init__(self, text):
+        self.text = "" if text is None else str(text)
+
+
+class Fields:
+    def __init__(self, items):
+        self.items = [(str(label), "" if value is None else str(value)) for label, value in items]
+
+
+class Table:
+    def __init__(self, header, rows):
+        self.header = [str(cell) for cell in header]
+        self.rows = [[str(cell) for cell in row] for row in rows]
+
+
+class Images:
+    def __init__(self, images, captions=True):
+        self.images = list(images)
+        self.captions = captions
+
+
+class Section:
+    """
+    A titled part of a report. The block methods return the section, so calls can be chained.
+    """
+
+    def __init__(self, title, level=1, page_break=False):
+        self.title = title
+        self.level = level
+        self.page_break = page_break
+        self.blocks = []
+
+    def text(self, text):
+        self.blocks.append(Text(text))
+        return self
+
+    def fields(self, items):
+        self.blocks.append(Fields(items))
+        return self
+
+    def table(self, header, rows):
+        self.blocks.append(Table(header, rows))
+        return self
+
+    def images(self, images, captions=True):
+        if images:
+            self.blocks.append(Images(images, captions))
+        return self
+
+
+class Report:
+    def __init__(self, title, subtitle=None):
+        self.title = title
+        self.subtitle = subtitle
+        self.sections = []
+
+    def section(self, title, level=1, page_break=False):
+        """
+        Append a new section and return it.
+        """
+        section = Section(title, level, page_break)
+        self.sections.append(section)
+        return section
+
+
+class ReportImage:
+    """
+    An image decoded and downsized once. Only its JPEG encoding is kept, it is
+    embedded as is into Word and PDF.
+    """
+
+    def __init__(self, name, image):
+        self.name = name
+        self.size = image.size
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=JPEG_QUALITY)
+        self.data = buffer.getvalue()
+
+
+class ImageCache:
+    """
+    Decodes the images of one export. The same content is decoded only once, even if
+    it is used in several places; broken images are reported in `warnings`.
+    """
+
+    def __init__(self, max_pixels=MAX_IMAGE_PIXELS):
+        self.max_pixels = max_pixels
+        self.warnings = []
+        self._images = {}
+
+    def get(self, name, content):
+        """
+        Returns the ReportImage for an image file, or None if it cannot be decoded.
+        """
+        key = hashlib.sha256(content).hexdigest()
+        if key not in self._images:
+            try:
+                image = Image.open(io.BytesIO(content))
+                image.thumbnail((self.max_pixels, self.max_pixels), Image.LANCZOS)
+                image = image.convert("RGB")
+                if image.width == 0 or image.height == 0:
+                    raise ValueError("Bildgröße ist 0")
+                self._images[key] = ReportImage(name, image)
+            except Exception as e:
+                self.warnings.append(f"Bild konnte nicht eingefügt werden: {name} ({e})")
+                self._images[key] = None
+        return self._images[key]
+
+    def prepare(self, files):
+        """
+        Returns the ReportImages of (name, content) tuples, skipping broken images.
+        """
+        return [image for image in (self.get(name, content) for name, content in files) if image is not None]
+
+
+@functools.lru_cache(maxsize=None)
+def _docx_template():
+    # The template is read once per process; every export starts from a copy of it
+    if DOCX_TEMPLATE is not None:
+        with open(DOCX_TEMPLATE, "rb") as f:
+            return f.read()
+    buffer = io.BytesIO()
+    docx.Document().save(buffer)
+    return buffer.getvalue()
+
+
+def render_docx(report, base=None):
+    """
+    Render a report as Word document.
+
+    Args:
+        report: The report.
+        base: Optional .docx content the sections are appended to, without the title
+            of the report.
+
+    Returns:
+        The .docx file content.
+    """
+    if base is None:
+        doc = docx.Document(io.BytesIO(_docx_template()))
+        doc.add_heading(report.title, 0)
+        if report.subtitle:
+            doc.add_paragraph(report.subtitle)
+    else:
+        doc = docx.Document(io.BytesIO(base))
+
+    for section in report.sections:
+        if section.page_break:
+            doc.add_page_break()
+        doc.add_heading(section.title, level=section.level)
+        for block in section.blocks:
+            if isinstance(block, Text):
+                doc.add_paragraph(block.text)
+            elif isinstance(block, Fields):
+                for label, value in block.items:
+                    paragraph = doc.add_paragraph()
+                    paragraph.add_run(f"{label}: ").bold = True
+                    paragraph.add_run(value)
+            elif isinstance(block, Table):
+                table = doc.add_table(rows=1, cols=len(block.header))
+                table.style = "Table Grid"
+                for cell, text in zip(table.rows[0].cells, block.header):
+                    cell.text = text
+                for row in block.rows:
+                    for cell, text in zip(table.add_row().cells, row):
+                        cell.text = text
+            elif isinstance(block, Images):
+                for image in block.images:
+                    doc.add_picture(io.BytesIO(image.data), width=WORD_IMAGE_WIDTH)
+                    if block.captions:
+                        doc.add_paragraph(image.name)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class _PdfImage(Flowable):
+    # Embeds the JPEG data as is, reportlab neither decodes nor re-encodes it
+    def __init__(self, image):
+        super().__init__()
+        width, height = image.size
+        scale = min(PDF_IMAGE_SIZE[0] / width, PDF_IMAGE_SIZE[1] / height)
+        self.reader = ImageReader(io.BytesIO(image.data))
+        self.width, self.height = width * scale, height * scale
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, width=self.width, height=self.height)
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles():
+    return getSampleStyleSheet()
+
+
+def _pdf_text(text):
+    return escape(text).replace("\n", "<br/>")
+
+
+def render_pdf(report, base=None):
+    """
+    Render a report as PDF (A4). Page breaks are done by reportlab.
+
+    Args:
+        report: The report.
+        base: Optional .pdf content the sections are appended to, without the title
+            of the report. They start on a new page after the existing ones.
+
+    Returns:
+        The .pdf file content.
+    """
+    styles = _pdf_styles()
+    headings = {1: styles["Heading2"], 2: styles["Heading3"]}
+    story = []
+    if base is None:
+        story.append(Paragraph(_pdf_text(report.title), styles["Title"]))
+        if report.subtitle:
+            story.append(Paragraph(_pdf_text(report.subtitle), styles["Normal"]))
+            story.append(Spacer(1, 0.5 * cm))
+
+    for section in report.sections:
+        if section.page_break:
+            story.append(PageBreak())
+        story.append(Paragraph(_pdf_text(section.title), headings.get(section.level, styles["Heading4"])))
+        for block in section.blocks:
+            if isinstance(block, Text):
+                story.append(Paragraph(_pdf_text(block.text), styles["Normal"]))
+            elif isinstance(block, Fields):
+                story.extend(Paragraph(f"<b>{_pdf_text(label)}:</b> {_pdf_text(value)}", styles["Normal"])
+                             for label, value in block.items)
+            elif isinstance(block, Table):
+                table = PdfTable([block.header] + block.rows, repeatRows=1, hAlign="LEFT")
+                table.setStyle(TableStyle([
+                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+                ]))
+                story.append(table)
+            elif isinstance(block, Images):
+                for image in block.images:
+                    story.append(_PdfImage(image))
+                    if block.captions:
+                        story.append(Paragraph(_pdf_text(image.name), styles["Italic"]))
+                    story.append(Spacer(1, 0.5 * cm))
+        story.append(Spacer(1, 0.4 * cm))
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm,
+                      topMargin=2 * cm, bottomMargin=2 * cm, title=report.title).build(story)
+    if base is None:
+        return buffer.getvalue()
+
+    # The existing pages are copied, not rendered again
+    writer = PdfWriter()
+    writer.append(io.BytesIO(base))
+    writer.append(io.BytesIO(buffer.getvalue()))
+    merged = io.BytesIO()
+    writer.write(merged)
+    return merged.getvalue()
@@ -0,0 +1,177 @@
+import hashlib, json, threading, time
+
+from utils.documents import RENDERER_VERSION
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # per user
+DEFAULT_MAX_AGE = 90 * 24 * 3600  # seconds since the last use
+TOUCH_INTERVAL = 3600  # last-use times are written to the manifest at most this often per entry
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def content_hash(*parts):
+    """
+    Canonical SHA-256 of JSON-serializable values. Bytes (e.g. images) are replaced
+    by their own hash, dict keys are sorted, so equal content always gives the same hash.
+    """
+    def default(value):
+        if isinstance(value, bytes):
+            return hashlib.sha256(value).hexdigest()
+        raise TypeError(f"Cannot hash {type(value).__name__} in export content")
+
+    canonical = json.dumps(parts, sort_keys=True, default=default, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ExportCache:
+    """
+    Cache of rendered Word/PDF exports of one user.
+
+    Entries are keyed by the hash of the exported content (including the images) and
+    the renderer version, so an unchanged entry is never rendered twice and a new
+    layout invalidates all entries. The documents are stored in the user's
+    `export_cache` folder next to a small `manifest.json` with size and last use of
+    every entry; it survives restarts and is used to evict entries that were not used
+    for `max_age` seconds or exceed the size cap, least recently used first.
+
+        >>> cache = data_manager.get_export_cache()
+        >>> key = cache.key("chemie", payload)
+        >>> cache.get(key) or cache.put(key, *render_chemie(payload)[:2])
+    """
+
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, data_handler, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        """
+        Initialize the cache and read its manifest.
+
+        Args:
+            data_handler: DataHandler for the user's cache folder.
+            max_bytes: Size cap in bytes for all cached documents together.
+            max_age: Seconds after their last use entries are evicted.
+        """
+        self.data_handler = data_handler
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.manifest = data_handler.load(self.MANIFEST_FILE, initial_value={"entries": {}})
+
+    @staticmethod
+    def key(kind, *content):
+        """
+        Returns the cache key of an export.
+
+        Args:
+            kind: Type of the document, e.g. "chemie" or "zellatlas".
+            *content: Everything the document is rendered from, see content_hash.
+        """
+        return content_hash(RENDERER_VERSION, kind, *content)
+
+    @staticmethod
+    def _files(key):
+        return f"{key}.docx", f"{key}.pdf"
+
+    def get(self, key):
+        """
+        Returns the cached (word bytes, pdf bytes) of an export, or None on a miss.
+        """
+        with self._lock:
+            entry = self.manifest["entries"].get(key)
+        if entry is None:
+            return None
+        try:
+            # The documents never change under their key, a locally cached copy is always valid
+            word, pdf = (self.data_handler.read_binary(name, revalidate=False) for name in self._files(key))
+        except FileNotFoundError:
+            with self._lock:
+                self.manifest["entries"].pop(key, None)
+                self._save()
+            return None
+        now = time.time()
+        with self._lock:
+            if now - entry["used"] > TOUCH_INTERVAL:
+                entry["used"] = now
+                self._save()
+        return word, pdf
+
+    def put(self, key, word, pdf, meta=None):
+        """
+        Store the documents of an export and evict old entries.
+
+        Args:
+            key: Cache key, see key.
+            word: Word document content.
+            pdf: PDF content.
+            meta: Optional JSON-serializable description stored in the manifest,
+                with "kind" it can be found again by latest.
+
+        Returns:
+            The (word bytes, pdf bytes) tuple that was stored.
+        """
+        word_name, pdf_name = self._files(key)
+        _, errors = self.data_handler.write_many({word_name: word, pdf_name: pdf})
+        if errors:
+            raise next(iter(errors.values()))
+        now = time.time()
+        with self._lock:
+            self.manifest["entries"][key] = {"size": len(word) + len(pdf), "created": now, "used": now}
+            if meta is not None:
+                self.manifest["entries"][key]["meta"] = meta
+            self._evict(now)
+            self._save()
+        return word, pdf
+
+    def latest(self, kind):
+        """
+        Returns (key, meta) of the newest entry stored with meta["kind"] == kind, or None.
+        """
+        with self._lock:
+            found = [(entry["created"], key, entry["meta"]) for key, entry in self.manifest["entries"].items()
+                     if entry.get("meta", {}).get("kind") == kind]
+        if not found:
+            return None
+        _, key, meta = max(found)
+        return key, meta
+
+    def remove(self, key):
+        """
+        Remove an entry, e.g. one that was superseded by a newer export.
+        """
+        with self._lock:
+            if self.manifest["entries"].pop(key, None) is None:
+                return
+            self._remove_files(key)
+            self._save()
+
+    def _remove_files(self, key):
+        for name in self._files(key):
+            try:
+                self.data_handler.filesystem.rm(self.data_handler.join(self.data_handler.root_path, name))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, now):
+        # called with the lock held
+        entries = self.manifest["entries"]
+        by_use = sorted(entries, key=lambda k: entries[k]["used"])
+        total = sum(entry["size"] for entry in entries.values())
+        for key in by_use:
+            if now - entries[key]["used"] <= self.max_age and total <= self.max_bytes:
+                break
+            total -= entries.pop(key)["size"]
+            self._remove_files(key)
+
+    def _save(self):
+        self.data_handler.save(self.MANIFEST_FILE, self.manifest)
+
+
+def get_export_cache(data_handler, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+    """
+    Returns the process-wide ExportCache for a cache folder, so all sessions of a user
+    share one manifest.
+    """
+    with _caches_lock:
+        if data_handler.root_path not in _caches:
+            _caches[data_handler.root_path] = ExportCache(data_handler, max_bytes, max_age)
+        return _caches[data_handler.root_path]
@@ -0,0 +1,290 @@
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import metrics
+from utils.export_cache import content_hash
+
+
+logger = logging.getLogger(__name__)
+
+MAX_PROCESSES = 2
+MAX_JOBS = 4  # jobs rendering or uploading at the same time, the others wait in the queue
+JOB_TTL = 15 * 60  # seconds a finished job (and its documents) stays available for download
+PENDING_TTL = 24 * 3600  # seconds planned documents protect their entry; afterwards a failed export counts as orphaned
+
+QUEUED, RENDERING, SAVING, DONE, ERROR = "queued", "rendering", "saving", "done", "error"
+PROGRESS = {QUEUED: 0.0, RENDERING: 0.2, SAVING: 0.7, DONE: 1.0, ERROR: 1.0}
+
+_queue = None
+_queue_lock = threading.Lock()
+_pending_lock = threading.Lock()  # serializes the read-merge-write of the pending export files
+
+
+def job_key(owner, kind, *content):
+    """
+    Returns the key identifying an export: the same user exporting the same content
+    of the same subject gets the same key, e.g. after a double click.
+
+    Args:
+        owner: User name.
+        kind: Subject of the export, e.g. "chemie".
+        *content: The renderer payload and everything else stored with the entry
+            (JSON-serializable). Bytes, e.g. images, are hashed.
+    """
+    return content_hash(owner, kind, *content)
+
+
+class ExportJob:
+    """
+    State of one export, shared between the worker thread and the polling page.
+    """
+
+    def __init__(self, key, owner, word_name, pdf_name):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.owner = owner
+        self.word_name = word_name
+        self.pdf_name = pdf_name
+        self.status = QUEUED
+        self.word = None
+        self.pdf = None
+        self.warnings = []
+        self.error = None
+        self.finished_at = None
+
+    @property
+    def progress(self):
+        return PROGRESS[self.status]
+
+    @property
+    def finished(self):
+        return self.status in (DONE, ERROR)
+
+
+class PendingExports:
+    """
+    Persistent list of the documents of a user that are planned but not stored yet.
+
+    Entries are stored before their Word & PDF are rendered. Pages register the
+    document names here before storing the entry and remove them once the documents
+    are stored, so the orphan check keeps entries of running, failed or interrupted
+    (e.g. by a restart) exports, giving the user time to retry. Names expire after
+    PENDING_TTL seconds, after that an entry whose documents were never stored is an
+    orphan. The names are kept with their registration time in `exports_pending.json`
+    in the user data folder; every change reloads and merges the file, so several
+    sessions can use it at the same time.
+
+        >>> pending = data_manager.get_pending_exports()
+        >>> pending.add("bericht.docx", "bericht.pdf")
+        >>> pending.remove("bericht.docx", "bericht.pdf")
+    """
+
+    PENDING_FILE = "exports_pending.json"
+
+    def __init__(self, data_handler):
+        """
+        Args:
+            data_handler: DataHandler for the user's data folder.
+        """
+        self.data_handler = data_handler
+
+    def _load(self):
+        # name -> registration time, expired names are dropped
+        names = self.data_handler.load(self.PENDING_FILE, initial_value={"names": {}})["names"]
+        now = time.time()
+        return {name: added for name, added in names.items() if now - added <= PENDING_TTL}
+
+    def names(self):
+        """
+        Returns the set of document names that are not stored yet and not expired.
+        """
+        return set(self._load())
+
+    def _update(self, add=(), remove=()):
+        with _pending_lock:
+            names = self._load()
+            now = time.time()
+            names.update((name, now) for name in add)
+            for name in remove:
+                names.pop(name, None)
+            self.data_handler.save(self.PENDING_FILE, {"names": names})
+
+    def add(self, *names):
+        """
+        Register document names before the entry referring to them is stored.
+        """
+        self._update(add=names)
+
+    def remove(self, *names):
+        """
+        Unregister document names after they were stored.
+        """
+        self._update(remove=names)
+
+
+class ExportQueue:
+    """
+    Runs Word/PDF exports in the background.
+
+    Rendering runs in a process pool, so building the documents and re-encoding
+    images neither blocks the Streamlit script thread nor competes for the GIL of
+    the server process. Storing the finished documents runs on a worker thread of
+    the server process, where the data handlers live. Pages submit a job and poll
+    its status; a job with the same key that is still running or finished
+    successfully is returned instead of starting a second export.
+
+        >>> queue = get_export_queue()
+        >>> job = queue.submit(key, username, render_chemie, payload, "bericht.docx", "bericht.pdf", store)
+        >>> queue.get(job.id).status
+        'rendering'
+    """
+
+    def __init__(self, max_processes=MAX_PROCESSES, max_jobs=MAX_JOBS):
+        self.max_processes = max_processes
+        self._jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._threads = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="export")
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking the multi-threaded server process is not safe
+                self._pool = ProcessPoolExecutor(max_workers=self.max_processes,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _prune(self):
+        # called with the lock held
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > JOB_TTL:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+    def find(self, key):
+        """
+        Returns the latest job with this key (running, done or failed), or None.
+        """
+        with self._lock:
+            self._prune()
+            return self._by_key.get(key)
+
+    def get(self, job_id):
+        """
+        Returns the job with this id, or None if it is unknown or expired.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self, owner):
+        """
+        Returns the document names of all unfinished exports of a user. Their entries
+        are already stored while the documents are not yet.
+        """
+        with self._lock:
+            return {name for job in self._jobs.values() if job.owner == owner and not job.finished
+                    for name in (job.word_name, job.pdf_name)}
+
+    def submit(self, key, owner, render, payload, word_name, pdf_name, store, cache=None, cache_key=None):
+        """
+        Start an export unless one with the same key is running or done. A failed
+        export is started again.
+
+        Args:
+            key: Key identifying the export, see job_key.
+            owner: User name.
+            render: Top-level function (picklable) taking the payload and returning
+                (word bytes, pdf bytes, warnings), see export_renderers.
+            payload: Picklable renderer input.
+            word_name: File name the Word document is stored under.
+            pdf_name: File name the PDF is stored under.
+            store: Function called with the finished job on a worker thread, stores
+                job.word and job.pdf.
+            cache: Optional ExportCache. Documents found under `cache_key` are used
+                without rendering, newly rendered ones are added.
+            cache_key: Key of the export in the cache, see ExportCache.key.
+
+        Returns:
+            ExportJob: The new job or the existing one.
+        """
+        with self._lock:
+            self._prune()
+            job = self._by_key.get(key)
+            if job is not None and job.status != ERROR:
+                return job
+            job = ExportJob(key, owner, word_name, pdf_name)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        self._threads.submit(self._run, job, render, payload, store, cache, cache_key)
+        return job
+
+    def _run(self, job, render, payload, store, cache=None, cache_key=None):
+        try:
+            cached = cache.get(cache_key) if cache is not None else None
+            if cached is not None:
+                job.word, job.pdf = cached
+            else:
+                job.status = RENDERING
+                pool = self._get_pool()
+                with metrics.track("render", "export"):
+                    try:
+                        job.word, job.pdf, job.warnings = pool.submit(render, payload).result()
+                    except BrokenProcessPool:
+                        self._reset_pool(pool)
+                        raise
+            job.status = SAVING
+            if cache is not None and cached is None and not job.warnings:
+                try:
+                    cache.put(cache_key, job.word, job.pdf)
+                except Exception:  # the export itself succeeded, it is just not cached
+                    logger.warning("Caching export %s failed", job.id, exc_info=True)
+            with metrics.track("store", "export"):
+                store(job)
+            job.status = DONE
+        except Exception as e:
+            logger.warning("Export %s (%s) failed", job.id, job.word_name, exc_info=True)
+            job.error = str(e) or type(e).__name__
+            job.status = ERROR
+        finally:
+            job.finished_at = time.monotonic()
+
+    def wait(self, timeout=None):
+        """
+        Block until all submitted jobs are finished, e.g. in benchmarks.
+
+        Returns:
+            True if all jobs finished, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if all(job.finished for job in self._jobs.values()):
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+
+
+def get_export_queue():
+    """
+    Returns the ExportQueue shared by all sessions of the process.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ExportQueue()
+        return _queue
@@ -0,0 +1,150 @@
+"""
+Word/PDF exports of the journal entries.
+
+The render functions run in the worker processes of the export queue (see
+export_jobs), so they only take plain, picklable payloads (str, int, bytes, lists
+and dicts) and never touch Streamlit or the storage. One builder per subject turns
+the payload into a Report (see documents), which is rendered to both formats in
+memory:
+
+    >>> word_bytes, pdf_bytes, warnings = render_chemie(payload)
+"""
+from utils.documents import ImageCache, Report, Section, render_docx, render_pdf
+
+
+def build_haematologie(payload, images):
+    """
+    Describe a Hämatologie report.
+
+    Args:
+        payload: Dict with "titel", "datum" (dd.mm.yyyy), "zellzaehlung" (list of
+            (zelltyp, zählung 1, zählung 2)), "abschnitte" (list of (titel, [(feld, wert)],
+            sonstiges)) and "bilder" (list of (name, bytes)).
+        images: ImageCache of the export.
+
+    Returns:
+        Report: The report.
+    """
+    report = Report(f"Befund: {payload['titel']}", subtitle=f"Datum: {payload['datum']}")
+    report.section("Zellzählung", level=2).table(
+        ["Zelltyp", "Zählung 1", "Zählung 2", "Durchschnitt"],
+        [[zelltyp, z1, z2, f"{(z1 + z2) / 2:.1f}"] for zelltyp, z1, z2 in payload["zellzaehlung"]])
+    for title, felder, sonstiges in payload["abschnitte"]:
+        report.section(title, level=2).fields(list(felder) + [("Sonstiges", sonstiges)])
+    bilder = images.prepare(payload["bilder"])
+    if bilder:
+        report.section("Bilder", level=2, page_break=True).images(bilder)
+    return report
+
+
+def build_chemie(payload, images):
+    """
+    Describe a Chemie lab report.
+
+    Args:
+        payload: Dict with "titel", "datum" (dd.mm.yyyy), "abschnitte" (list of
+            (überschrift, text)) and "bilder" (list of (name, bytes)).
+        images: ImageCache of the export.
+
+    Returns:
+        Report: The report.
+    """
+    report = Report(f"Praktikum: {payload['titel']}", subtitle=f"Datum: {payload['datum']}")
+    for header, content in payload["abschnitte"]:
+        report.section(header, level=2).text(content)
+    bilder = images.prepare(payload["bilder"])
+    if bilder:
+        report.section("Mikroskopiebilder / Versuchsbilder", level=2, page_break=True).images(bilder, captions=False)
+    return report
+
+
+def build_klinische_chemie(payload, images):
+    """
+    Describe a Klinische Chemie report.
+
+    Args:
+        payload: Dict with "titel" (the report line below the heading), "abschnitte"
+            (list of (abschnitt, [(label, wert)])) and "bilder" (list of (name, bytes)).
+        images: ImageCache of the export.
+
+    Returns:
+        Report: The report.
+    """
+    report = Report("Klinische Chemie", subtitle=payload["titel"])
+    for abschnitt, inhalte in payload["abschnitte"]:
+        report.section(abschnitt).fields(inhalte)
+    bilder = images.prepare(payload["bilder"])
+    if bilder:
+        report.section("Mikroskopiebilder / Befundbilder", page_break=True).images(bilder)
+    return report
+
+
+ZELLATLAS_TITLE = "Zellatlas Hämatologie"
+
+
+def zellatlas_section(eintrag, images):
+    """
+    Describe one entry of the cell atlas.
+
+    Args:
+        eintrag: Dict with "typ", "zeit" (formatted), "beschreibung" and "bild"
+            ((name, bytes) or None).
+        images: ImageCache of the export.
+
+    Returns:
+        Section: The section of the entry.
+    """
+    section = Section(eintrag["typ"]).text(f"Erstellt am: {eintrag['zeit']}").text(eintrag["beschreibung"])
+    if eintrag.get("bild"):
+        name, content = eintrag["bild"]
+        image = images.get(name, content)
+        if image is None:
+            section.text(f"⚠️ Bild {name} konnte nicht eingefügt werden.")
+        else:
+            section.images([image], captions=False)
+    return section
+
+
+def build_zellatlas(eintraege, images):
+    """
+    Describe the complete cell atlas of a user.
+
+    Args:
+        eintraege: List of entry dicts (see zellatlas_section), in the order they
+            appear in the document.
+        images: ImageCache of the export.
+
+    Returns:
+        Report: The report.
+    """
+    report = Report(ZELLATLAS_TITLE)
+    report.sections.extend(zellatlas_section(eintrag, images) for eintrag in eintraege)
+    return report
+
+
+def render(build, payload):
+    """
+    Build a report and render it as Word and PDF, decoding every image only once.
+
+    Returns:
+        A (word bytes, pdf bytes, warnings) tuple.
+    """
+    images = ImageCache()
+    report = build(payload, images)
+    return render_docx(report), render_pdf(report), images.warnings
+
+
+def render_haematologie(payload):
+    return render(build_haematologie, payload)
+
+
+def render_chemie(payload):
+    return render(build_chemie, payload)
+
+
+def render_klinische_chemie(payload):
+    return render(build_klinische_chemie, payload)
+
+
+def render_zellatlas(eintraege):
+    return render(build_zellatlas, eintraege)
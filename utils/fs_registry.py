@@ -0,0 +1,72 @@
+import hashlib, threading
+import fsspec
+
+# Connection pool limits for shared WebDAV clients
+WEBDAV_MAX_CONNECTIONS = 32
+WEBDAV_MAX_KEEPALIVE_CONNECTIONS = 16
+WEBDAV_KEEPALIVE_EXPIRY = 60  # seconds
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _registry_key(protocol, base_url=None, username=None, password=None):
+    # Never keep the plain password in the key, a digest is enough to tell credentials apart
+    password_digest = hashlib.sha256(password.encode("utf-8")).hexdigest() if password else None
+    return (protocol, base_url, username, password_digest)
+
+
+def get_filesystem(protocol, base_url=None, username=None, password=None):
+    """
+    Return the process-wide fsspec filesystem for the given protocol and credentials.
+
+    Filesystems are created once per process and shared by all Streamlit sessions,
+    so that every session reuses the same HTTP connection pool instead of opening
+    its own connections to the WebDAV server.
+
+    Args:
+        protocol: The filesystem protocol ('webdav' or 'file').
+        base_url: The WebDAV base URL (webdav only).
+        username: The WebDAV user name (webdav only).
+        password: The WebDAV password (webdav only).
+
+    Returns:
+        fsspec.AbstractFileSystem: The shared filesystem instance.
+
+    Raises:
+        ValueError: If an unsupported protocol is specified.
+    """
+    key = _registry_key(protocol, base_url, username, password)
+    filesystem = _registry.get(key)
+    if filesystem is not None:
+        return filesystem
+
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = _create_filesystem(protocol, base_url, username, password)
+        return _registry[key]
+
+
+def _create_filesystem(protocol, base_url, username, password):
+    if protocol == 'webdav':
+        import httpx  # installed together with webdav4
+        limits = httpx.Limits(max_connections=WEBDAV_MAX_CONNECTIONS,
+                              max_keepalive_connections=WEBDAV_MAX_KEEPALIVE_CONNECTIONS,
+                              keepalive_expiry=WEBDAV_KEEPALIVE_EXPIRY)
+        return fsspec.filesystem('webdav',
+                                 base_url=base_url,
+                                 auth=(username, password),
+                                 limits=limits,
+                                 skip_instance_cache=True)
+    elif protocol == 'file':
+        return fsspec.filesystem('file')
+    else:
+        raise ValueError(f"fs_registry: Invalid filesystem protocol: {protocol}")
+
+
+def clear():
+    """
+    Drop all registered filesystems, e.g. after the WebDAV credentials were changed.
+    """
+    with _registry_lock:
+        _registry.clear()
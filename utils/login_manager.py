@@ -2,7 +2,7 @@ import secrets
 import streamlit as st
 import streamlit_authenticator as stauth
 from utils.data_manager import DataManager
-import base64
+from utils.assets import get_assets
 
 class LoginManager:
     """
@@ -78,9 +78,7 @@ class LoginManager:
         """, unsafe_allow_html=True)
 
         try:
-            with open("assets/labor.png", "rb") as f:
-                image_data = f.read()
-                self.img_html = f'<img src="data:image/png;base64,{base64.b64encode(image_data).decode("utf-8")}" width="48" style="vertical-align: middle;">'
+            self.img_html = f'<img src="{get_assets().url("labor")}" width="48" style="vertical-align: middle;">'
         except Exception:
             self.img_html = ""
 
@@ -0,0 +1,175 @@
+import contextlib, functools, json, os, threading, time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_lock = threading.Lock()
+_series = {}  # (operation, folder, result) -> {"count", "sum", "bytes", "buckets"}
+_exporters = {}
+
+
+class Measurement:
+    """
+    Handle yielded by track() to report the number of transferred bytes.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+
+def observe(operation, folder, result, seconds, num_bytes=0):
+    """
+    Record one storage operation.
+
+    Args:
+        operation: Name of the operation, e.g. 'read_binary'.
+        folder: Subject folder or dataset the operation worked on.
+        result: 'ok', 'not_found' or 'error'.
+        seconds: Duration of the operation.
+        num_bytes: Number of bytes transferred.
+    """
+    key = (operation, folder, result)
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = {"count": 0, "sum": 0.0, "bytes": 0, "buckets": [0] * len(LATENCY_BUCKETS)}
+        series["count"] += 1
+        series["sum"] += seconds
+        series["bytes"] += num_bytes
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                series["buckets"][i] += 1
+                break
+
+
+@contextlib.contextmanager
+def track(operation, folder):
+    """
+    Context manager measuring the duration and result of a block.
+
+        >>> with metrics.track("read_binary", "word_chemie") as m:
+        ...     data = f.read()
+        ...     m.bytes = len(data)
+    """
+    measurement = Measurement()
+    start = time.perf_counter()
+    result = "error"
+    try:
+        yield measurement
+        result = "ok"
+    except FileNotFoundError:
+        result = "not_found"
+        raise
+    finally:
+        observe(operation, folder, result, time.perf_counter() - start, measurement.bytes)
+
+
+def timed(operation, folder=None, count_bytes=None):
+    """
+    Decorator recording every call of a method with track().
+
+    Args:
+        operation: Name of the operation.
+        folder: Callable receiving the call arguments (including self) and returning the folder label.
+            Defaults to the `metrics_folder` attribute of self.
+        count_bytes: 'result' to count the length of the return value, 'content' to count
+            the length of the content argument (second positional argument).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            label = folder(self, *args, **kwargs) if folder else getattr(self, "metrics_folder", "-")
+            with track(operation, label) as m:
+                result = func(self, *args, **kwargs)
+                if count_bytes == "result" and isinstance(result, (bytes, str)):
+                    m.bytes = len(result)
+                elif count_bytes == "content":
+                    content = kwargs.get("content", args[1] if len(args) > 1 else None)
+                    if isinstance(content, (bytes, str)):
+                        m.bytes = len(content)
+                return result
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """
+    Returns a copy of all recorded series as a list of dicts.
+    """
+    with _lock:
+        return [
+            {"operation": op, "folder": folder, "result": result,
+             "count": s["count"], "sum_seconds": s["sum"], "bytes": s["bytes"],
+             "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS], s["buckets"]))}
+            for (op, folder, result), s in sorted(_series.items())
+        ]
+
+
+def to_prometheus():
+    """
+    Render all series in the Prometheus text exposition format.
+
+    Returns:
+        The metrics as string.
+    """
+    lines = [
+        "# HELP labjournal_storage_seconds Duration of storage operations.",
+        "# TYPE labjournal_storage_seconds histogram",
+    ]
+    byte_lines = [
+        "# HELP labjournal_storage_bytes_total Bytes transferred by storage operations.",
+        "# TYPE labjournal_storage_bytes_total counter",
+    ]
+    for s in snapshot():
+        labels = f'operation="{s["operation"]}",folder="{s["folder"]}",result="{s["result"]}"'
+        cumulative = 0
+        for bound, count in s["buckets"].items():
+            cumulative += count
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f'labjournal_storage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"labjournal_storage_seconds_sum{{{labels}}} {s['sum_seconds']}")
+        lines.append(f"labjournal_storage_seconds_count{{{labels}}} {s['count']}")
+        byte_lines.append(f"labjournal_storage_bytes_total{{{labels}}} {s['bytes']}")
+    return "\n".join(lines + byte_lines) + "\n"
+
+
+def export(path):
+    """
+    Write a snapshot to a local file. Files ending in .json get JSON, all others the Prometheus text format.
+    The file is replaced atomically so a scraper never reads a partial snapshot.
+    """
+    content = json.dumps(snapshot(), indent=2) if path.endswith(".json") else to_prometheus()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def start_export(path, interval=15):
+    """
+    Export a snapshot to `path` every `interval` seconds in a background thread (once per process and path).
+    """
+    with _lock:
+        if path in _exporters:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    export(path)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=run, daemon=True, name="metrics-export")
+        _exporters[path] = thread
+        thread.start()
+
+
+def reset():
+    """
+    Drop all recorded series.
+    """
+    with _lock:
+        _series.clear()
@@ -0,0 +1,145 @@
+import ast, json
+import pandas as pd
+
+
+def _parse_list(value):
+    """
+    Parse a list cell as stored in a table file. CSV files store lists as JSON; older
+    files contain the Python repr of the list, which is accepted as well.
+    """
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if hasattr(value, "tolist"):  # list columns read from parquet arrive as numpy arrays
+        return list(value.tolist())
+    if not isinstance(value, str) or not value.strip():
+        return []
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    return list(parsed) if isinstance(parsed, (list, tuple)) else []
+
+
+class TableSchema:
+    """
+    Column types of a stored table.
+
+    A schema converts a freshly loaded DataFrame into typed columns (text, lists,
+    datetimes) once at load time, and converts it back into its storage form
+    (lists as JSON, dates as formatted strings) before saving.
+
+        >>> schema = TableSchema(text_columns=["titel"], list_columns=["anhaenge"],
+        ...                      date_columns={"datum": "%Y-%m-%d"})
+        >>> df = schema.apply(pd.read_csv("data.csv", **schema.read_args()))
+    """
+
+    def __init__(self, text_columns=(), list_columns=(), date_columns=None):
+        """
+        Args:
+            text_columns: Columns holding strings. Missing values become "".
+            list_columns: Columns holding lists of strings.
+            date_columns: Dict mapping datetime columns to their storage format.
+        """
+        self.text_columns = list(text_columns)
+        self.list_columns = list(list_columns)
+        self.date_columns = dict(date_columns or {})
+
+    @property
+    def columns(self):
+        return self.text_columns + self.list_columns + list(self.date_columns)
+
+    def read_args(self):
+        """
+        Returns the pd.read_csv arguments that keep text columns as strings (e.g. semester "1" instead of 1).
+        """
+        return {"dtype": {col: str for col in self.text_columns + self.list_columns}}
+
+    def apply(self, data, columns=None):
+        """
+        Convert loaded data into a typed DataFrame.
+
+        Args:
+            data: A DataFrame or a list of records.
+            columns: Optional column projection. Only these schema columns are added if missing.
+
+        Returns:
+            A new DataFrame containing at least all (projected) schema columns with their types applied.
+        """
+        df = data.copy() if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        wanted = set(self.columns if columns is None else columns)
+        for col in self.text_columns:
+            if col not in wanted and col not in df.columns:
+                continue
+            if col in df.columns:
+                df[col] = df[col].fillna("").astype(str)
+            else:
+                df[col] = pd.Series("", index=df.index, dtype=str)
+        for col in self.list_columns:
+            if col not in wanted and col not in df.columns:
+                continue
+            if col in df.columns:
+                df[col] = df[col].map(_parse_list)
+            else:
+                df[col] = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+        for col, fmt in self.date_columns.items():
+            if col not in wanted and col not in df.columns:
+                continue
+            if col in df.columns:
+                if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                    df[col] = pd.to_datetime(df[col], format=fmt, errors="coerce")
+            else:
+                df[col] = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        return df
+
+    def serialize(self, df, native=False):
+        """
+        Convert a typed DataFrame back into its storage form.
+
+        Args:
+            df: The DataFrame to store.
+            native: The target format stores lists and datetimes natively (parquet),
+                so the typed columns are kept as they are.
+
+        Returns:
+            A new DataFrame with list columns as JSON strings and date columns as formatted strings.
+        """
+        if native:
+            return self.apply(df, columns=[])
+        df = df.copy()
+        for col in self.list_columns:
+            if col in df.columns:
+                df[col] = df[col].map(lambda value: json.dumps(_parse_list(value), ensure_ascii=False))
+        for col, fmt in self.date_columns.items():
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], format="mixed", errors="coerce").dt.strftime(fmt)
+        return df
+
+
+_ENTRY_TEXT_COLUMNS = ["titel", "semester", "dateiname"]
+_ENTRY_LIST_COLUMNS = ["anhaenge", "bilder"]
+_ENTRY_DATE_COLUMNS = {"datum": "%Y-%m-%d", "zeit": "%Y-%m-%d %H:%M:%S"}
+
+CHEMIE_SCHEMA = TableSchema(
+    text_columns=_ENTRY_TEXT_COLUMNS + ["beschreibung", "material", "fragen", "arbeitsschritte", "ziel"],
+    list_columns=_ENTRY_LIST_COLUMNS,
+    date_columns=_ENTRY_DATE_COLUMNS,
+)
+
+HAEMATOLOGIE_SCHEMA = TableSchema(
+    text_columns=_ENTRY_TEXT_COLUMNS + ["pdfname"],
+    list_columns=_ENTRY_LIST_COLUMNS,
+    date_columns=_ENTRY_DATE_COLUMNS,
+)
+
+KLINISCHE_CHEMIE_SCHEMA = TableSchema(
+    text_columns=_ENTRY_TEXT_COLUMNS + [
+        "patient_name", "geburtstag", "geschlecht", "groesse", "gewicht",
+        "vorbefunde", "probenmaterial", "makro", "reagenzien", "qc", "methode",
+        "validation", "transversal", "extremwerte", "trend", "konstellation",
+    ],
+    list_columns=_ENTRY_LIST_COLUMNS,
+    date_columns=_ENTRY_DATE_COLUMNS,
+)
@@ -0,0 +1,263 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from datetime import date, datetime
+
+import pandas as pd
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def fold(text):
+    """
+    Lowercase a text and fold umlauts and accents, so "Hämatologie", "Haematologie"
+    and "HAEMATOLOGIE" all end up as "haematologie".
+    """
+    text = str(text).lower().translate(_UMLAUTS)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(value):
+    """
+    Split a cell value into folded search tokens.
+
+    Strings are split at every non-alphanumeric character, lists are tokenized element
+    by element and dates are indexed in ISO (2025-05-08) and Swiss (08.05.2025) notation.
+
+    Args:
+        value: A string, a list of strings, a date/timestamp or a missing value.
+
+    Returns:
+        A list of tokens, possibly with duplicates.
+    """
+    if hasattr(value, "tolist"):  # numpy arrays and scalars, e.g. list columns read from parquet
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [token for item in value for token in tokenize(item)]
+    if isinstance(value, (datetime, date)):
+        if pd.isna(value):
+            return []
+        return tokenize(value.strftime("%Y-%m-%d %d.%m.%Y"))
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return []
+    return _TOKEN_PATTERN.findall(fold(value))
+
+
+class SearchIndex:
+    """
+    Inverted full-text index over the records of a user table.
+
+    The index maps every token to the ids of the records containing it. Queries
+    treat each query token as a prefix and return the records matching all of them;
+    prefix ranges are found by bisecting the sorted vocabulary, so a query costs
+    a few dictionary lookups no matter how many entries a user has written.
+
+    The index is stored next to the table as a journaled parquet file with one row
+    (id, tokens) per record. Adding a record only writes a small journal segment.
+
+        >>> index = SearchIndex(dh, "data_chemie.search.v2.parquet", fields=["titel", "beschreibung", "datum"])
+        >>> index.load()
+        >>> index.add({"dateiname": "20250508_titration.docx", "titel": "Titration", ...})
+        >>> index.search("titra")
+        {'20250508_titration.docx'}
+    """
+
+    def __init__(self, data_handler, file_name, fields, id_column="dateiname"):
+        """
+        Initialize an empty index.
+
+        Args:
+            data_handler: DataHandler for the folder the index file is stored in.
+            file_name: Name of the index file (.parquet).
+            fields: Record fields whose content is indexed.
+            id_column: Record field identifying a record.
+        """
+        self.data_handler = data_handler
+        self.file_name = file_name
+        self.fields = list(fields)
+        self.id_column = id_column
+        self.docs = {}
+        self.postings = {}
+        self._vocabulary = None
+        self.segments = []  # stored journal segments whose rows are in docs
+        self.revision = None
+
+    def document_tokens(self, record):
+        """
+        Return the sorted, de-duplicated tokens of all indexed fields of a record.
+        """
+        tokens = set()
+        for field in self.fields:
+            if field in record:
+                tokens.update(tokenize(record[field]))
+        return sorted(tokens)
+
+    def _set(self, doc_id, tokens):
+        self._discard(doc_id)
+        self.docs[doc_id] = tokens
+        for token in tokens:
+            if token not in self.postings:
+                self.postings[token] = set()
+                self._vocabulary = None
+            self.postings[token].add(doc_id)
+
+    def _discard(self, doc_id):
+        for token in self.docs.pop(doc_id, ()):
+            ids = self.postings[token]
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[token]
+                self._vocabulary = None
+
+    def _rows(self):
+        return pd.DataFrame({"id": list(self.docs), "tokens": [" ".join(t) for t in self.docs.values()]},
+                            columns=["id", "tokens"])
+
+    def exists(self):
+        """
+        Check whether the index has been stored before (base file or journal segments).
+        """
+        base_version, segments = self.data_handler.version(self.file_name, journal=True)
+        return base_version is not None or bool(segments)
+
+    def load(self):
+        """
+        Read the stored index, replacing the in-memory state. Later rows win over earlier ones.
+        """
+        self.docs = {}
+        self.postings = {}
+        self._vocabulary = None
+        rows, self.segments = self.data_handler.read_journal(self.file_name, initial_value=[])
+        rows = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, columns=["id", "tokens"])
+        for doc_id, tokens in zip(rows["id"], rows["tokens"].fillna("")):
+            self._set(doc_id, tokens.split())
+
+    def build(self, records):
+        """
+        Index all records of a table from scratch and store the index.
+
+        Args:
+            records: DataFrame (or list of dicts) with the complete table.
+        """
+        records = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        segments = self.data_handler._list_journal(self.file_name)
+        self.docs = {}
+        self.postings = {}
+        self._vocabulary = None
+        if self.id_column in records.columns:
+            for record in records.to_dict("records"):
+                if record[self.id_column]:
+                    self._set(record[self.id_column], self.document_tokens(record))
+        self.data_handler.compact_journal(self.file_name, self._rows(), segments=segments)
+        self.segments = []
+
+    def add(self, record):
+        """
+        Index a new or changed record and append it to the stored index.
+
+        Args:
+            record: The record as dict. Records without id are ignored.
+        """
+        doc_id = record.get(self.id_column)
+        if not doc_id:
+            return
+        tokens = self.document_tokens(record)
+        self._set(doc_id, tokens)
+        self.segments.append(self.data_handler.append_journal(self.file_name, {"id": doc_id, "tokens": " ".join(tokens)}))
+
+    def remove(self, doc_ids):
+        """
+        Remove records from the index and rewrite the stored index.
+
+        Args:
+            doc_ids: Ids of the records to remove.
+        """
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in self.docs]
+        if not doc_ids:
+            return
+        for doc_id in doc_ids:
+            self._discard(doc_id)
+        self.data_handler.compact_journal(self.file_name, self._rows(), segments=self.segments)
+        self.segments = []
+
+    def vocabulary(self):
+        """
+        Return the sorted list of all tokens, rebuilt only after new tokens were added.
+        """
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def _prefix_ids(self, prefix):
+        vocabulary = self.vocabulary()
+        ids = set()
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            if not vocabulary[i].startswith(prefix):
+                break
+            ids |= self.postings[vocabulary[i]]
+        return ids
+
+    def search(self, query):
+        """
+        Find the records matching every token of a query, each token matched as prefix.
+
+        Args:
+            query: The search text, e.g. "vitam 2025".
+
+        Returns:
+            A set of record ids, or None for a query without tokens (no filtering).
+        """
+        tokens = sorted(set(tokenize(query)), key=len, reverse=True)  # long prefixes are most selective
+        if not tokens:
+            return None
+        result = None
+        for token in tokens:
+            ids = self._prefix_ids(token)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def rank(self, query):
+        """
+        Find the records matching a query, best matches first.
+
+        A query token matching a whole word of a record scores 2, one only matching
+        the beginning of a word scores 1. Ties are ordered by descending id, which puts
+        newer entries first for the timestamped file names used as ids.
+
+        Args:
+            query: The search text.
+
+        Returns:
+            A list of (record id, score) tuples, empty for a query without tokens.
+        """
+        matches = self.search(query)
+        if not matches:
+            return []
+        scores = dict.fromkeys(matches, 0)
+        for token in set(tokenize(query)):
+            exact = self.postings.get(token, set())
+            for doc_id in matches:
+                scores[doc_id] += 2 if doc_id in exact else 1
+        return sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+    @classmethod
+    def merge(cls, indexes):
+        """
+        Combine several indexes into one read-only in-memory index.
+
+        Args:
+            indexes: Dict mapping a source name (e.g. the subject) to its SearchIndex.
+
+        Returns:
+            A SearchIndex without storage whose ids are (source name, record id) tuples.
+        """
+        merged = cls(None, None, fields=[])
+        for source, index in indexes.items():
+            for doc_id, tokens in index.docs.items():
+                merged._set((source, doc_id), tokens)
+        return merged
@@ -0,0 +1,103 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = (".docx", ".pdf")
+MAX_WORKERS = 2
+MAX_TEXT_CHARS = 200_000  # text beyond this is not indexed, keeps the index compact
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def extract_docx(content):
+    from docx import Document
+
+    doc = Document(BytesIO(content))
+    parts = [paragraph.text for paragraph in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            parts.extend(cell.text for cell in row.cells)
+    return "\n".join(parts)
+
+
+def extract_pdf(content):
+    from pypdf import PdfReader
+
+    reader = PdfReader(BytesIO(content))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def supports(file_name):
+    """
+    Check whether the text of a file can be extracted, based on its extension.
+    """
+    return posixpath.splitext(file_name)[-1].lower() in EXTENSIONS
+
+
+def extract_text(file_name, content):
+    """
+    Extract the plain text of a PDF or Word file.
+
+    Args:
+        file_name: Name of the file, used to pick the extractor.
+        content: The binary file content.
+
+    Returns:
+        The extracted text (at most MAX_TEXT_CHARS characters).
+
+    Raises:
+        ValueError: If there is no extractor for the file type.
+    """
+    ext = posixpath.splitext(file_name)[-1].lower()
+    with metrics.track("extract_text", "attachments"):
+        if ext == ".docx":
+            text = extract_docx(content)
+        elif ext == ".pdf":
+            text = extract_pdf(content)
+        else:
+            raise ValueError(f"No text extractor for file type {ext}")
+    return text[:MAX_TEXT_CHARS]
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="text_extraction")
+        return _executor
+
+
+def _index_file(index, file_name, content):
+    try:
+        text = extract_text(file_name, content)
+    except Exception:  # broken or encrypted files are simply not searchable
+        logger.warning("Text extraction failed for %s", file_name, exc_info=True)
+        return
+    index.add({index.id_column: file_name, "text": text})
+
+
+def index_async(index, files):
+    """
+    Extract the text of files in the background worker pool and add it to a search index.
+
+    Files without extractor are skipped. Every file is appended to the index as soon as
+    its text is extracted; the caller does not wait for it.
+
+    Args:
+        index: SearchIndex with the fields (id_column, "text"). It is only appended to,
+            so it does not need to be loaded.
+        files: List of (file_name, content) tuples.
+
+    Returns:
+        The list of futures, one per submitted file.
+    """
+    return [_get_executor().submit(_index_file, index, file_name, content)
+            for file_name, content in files if supports(file_name)]
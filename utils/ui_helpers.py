@@ -1,4 +1,5 @@
 import streamlit as st
+from utils import export_jobs
 
 def apply_theme():
     theme = st.session_state.get("theme", "light")
@@ -19,3 +20,39 @@ def apply_theme():
                 .stRadio > div { background-color: transparent !important; }
             </style>
         """, unsafe_allow_html=True)
+
+
+WORD_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+EXPORT_STATUS_TEXT = {
+    export_jobs.QUEUED: "Export wartet …",
+    export_jobs.RENDERING: "Word und PDF werden erstellt …",
+    export_jobs.SAVING: "Dokumente werden gespeichert …",
+}
+
+@st.fragment(run_every=1)
+def _export_fortschritt(job_id):
+    # Nur dieser Teil der Seite wird jede Sekunde neu ausgeführt, bis der Export fertig ist
+    job = export_jobs.get_export_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.progress, text=EXPORT_STATUS_TEXT[job.status])
+
+def zeige_export(session_key):
+    # Status des zuletzt gestarteten Exports; fertige Dokumente zum Herunterladen anbieten
+    job = export_jobs.get_export_queue().get(st.session_state.get(session_key))
+    if job is None:
+        return None
+    if not job.finished:
+        _export_fortschritt(job.id)
+        return job
+    if job.status == export_jobs.ERROR:
+        st.error(f"❌ Export fehlgeschlagen: {job.error}")
+        return job
+    for warnung in job.warnings:
+        st.warning(f"⚠️ {warnung}")
+    st.success("✅ Word und PDF wurden erstellt!")
+    st.download_button("⬇️ Word herunterladen", data=job.word, file_name=job.word_name, mime=WORD_MIME,
+                       key=f"word_{job.id}")
+    st.download_button("⬇️ PDF herunterladen", data=job.pdf, file_name=job.pdf_name, mime="application/pdf",
+                       key=f"pdf_{job.id}")
+    return job